@@ -0,0 +1,181 @@
+"""
+Measures orchestrator overhead, memory and throughput with stand-in agents.
+
+Every scenario (number of agents x number of tasks) runs in a fresh process that
+drives orchestrate-batch against agents registered as fake_agent.py. No network
+or model is needed, and regressions in run_agent, the scheduler and scaffolding
+show up as numbers.
+
+Usage:
+    python benchmarks/bench_orchestrator.py --agents 1,4,16 --tasks 1,20 --latency 0.2
+    python benchmarks/bench_orchestrator.py --agents 8 --tasks 50 --output-bytes 5000000 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_AGENT = os.path.join(REPO_DIR, "benchmarks", "fake_agent.py")
+sys.path.insert(0, REPO_DIR)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round((len(values) - 1) * fraction)))]
+
+
+def run_worker(scenario_path):
+    """
+    Runs one scenario inside this process and prints its measurements as JSON.
+    """
+    with open(scenario_path) as f:
+        scenario = json.load(f)
+    os.chdir(scenario["workspace"]) # orchestrator.log and memory/ go to the scenario workspace
+    import crypto_ai_orchestrator as orchestrator
+    orchestrator.load_config(scenario["config_path"])
+    memory_dir = os.path.join(scenario["workspace"], "memory")
+    os.makedirs(memory_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    asyncio.run(orchestrator.orchestrate_batch(scenario["manifest_path"], memory_dir, workspace=scenario["workspace"],
+                                               max_parallel_tasks=scenario["tasks"], use_cache=False,
+                                               isolate=scenario["isolate"]))
+    wall = time.perf_counter() - start
+
+    store = orchestrator.HistoryStore(memory_dir)
+    try:
+        records = store.query()
+    finally:
+        store.close()
+    results = [result for record in records for result in record["agent_results"].values()]
+    print(json.dumps({
+        "wall_seconds": wall,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "statuses": [record["status"] for record in records],
+        "orchestration_overheads": [record["duration_seconds"] - record["critical_path"]["seconds"]
+                                    for record in records if record.get("critical_path")],
+        "scaffold_seconds": [record["scaffold_seconds"] for record in records if "scaffold_seconds" in record],
+        "spawn_seconds": [result["spawn_seconds"] for result in results if "spawn_seconds" in result],
+        "agent_wall_seconds": [result["wall_seconds"] for result in results if "wall_seconds" in result],
+        "queue_wait_seconds": [result["queue_wait_seconds"] for result in results if "queue_wait_seconds" in result],
+    }))
+
+
+def fake_agent_argv(args, index):
+    argv = [sys.executable, FAKE_AGENT, "--task", "{task}", "--latency", str(args.latency),
+            "--output-bytes", str(args.output_bytes), "--fail-rate", str(args.fail_rate),
+            "--write-files", str(args.write_files)]
+    if args.hang_every and (index + 1) % args.hang_every == 0:
+        argv.append("--hang")
+    return argv
+
+
+def calibrate_fake_agent():
+    """
+    Median run time of a zero-latency fake agent, i.e. its own interpreter startup cost.
+    """
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, FAKE_AGENT], stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run_scenario(args, agents, tasks):
+    workspace = tempfile.mkdtemp(prefix=f"bench-orchestrator-{agents}x{tasks}-")
+    try:
+        with open(os.path.join(REPO_DIR, "config.json")) as f:
+            config = json.load(f)
+        agent_names = [f"fake-{i}" for i in range(agents)]
+        config.update({
+            "agents": {name: {"argv": fake_agent_argv(args, i)} for i, name in enumerate(agent_names)},
+            "default_agents": agent_names,
+            "agent_dependencies": {},
+            "agent_concurrency_limits": {},
+            "max_concurrent_tasks": args.max_concurrent,
+            "timeout_seconds": args.agent_timeout,
+            "skeleton_cache_dir": os.path.join(workspace, "skeleton-cache"),
+            "result_cache_enabled": False,
+            "metrics_textfile": None,
+        })
+        config_path = os.path.join(workspace, "config.json")
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+        manifest_path = os.path.join(workspace, "manifest.jsonl")
+        with open(manifest_path, "w") as f:
+            for i in range(tasks):
+                f.write(json.dumps({"task": f"benchmark task {i}", "project_type": args.project_type}) + "\n")
+        scenario_path = os.path.join(workspace, "scenario.json")
+        with open(scenario_path, "w") as f:
+            json.dump({"workspace": workspace, "config_path": config_path, "manifest_path": manifest_path,
+                       "tasks": tasks, "isolate": args.isolate}, f)
+
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", scenario_path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark orchestrator overhead with fake agents.")
+    parser.add_argument("--agents", default="1,2,4,8", help="Comma-separated agent counts per task.")
+    parser.add_argument("--tasks", default="1,10", help="Comma-separated task counts per batch.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated work per agent, in seconds.")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Output written by each agent.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability that an agent fails.")
+    parser.add_argument("--write-files", type=int, default=0, help="Files written into the project by each agent.")
+    parser.add_argument("--isolate", action="store_true", help="Run the agents in per-agent workspace snapshots.")
+    parser.add_argument("--hang-every", type=int, default=0, help="Make every Nth agent hang until its timeout.")
+    parser.add_argument("--agent-timeout", type=float, default=10, help="timeout_seconds for the fake agents.")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="max_concurrent_tasks for the scheduler.")
+    parser.add_argument("--project-type", default="revolution", help="Project template to scaffold.")
+    parser.add_argument("--json", help="Also write the raw measurements to this file.")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    startup = calibrate_fake_agent()
+    print(f"fake agent startup (subtracted from agent overhead): {startup * 1000:.1f} ms")
+    header = (f"{'agents':>6} {'tasks':>6} {'wall s':>8} {'ideal s':>8} {'effic':>6} {'tasks/s':>8} {'runs/s':>8} "
+              f"{'orch ovh p50 ms':>15} {'agent ovh p50 ms':>16} {'spawn p95 ms':>12} {'queue p95 s':>11} {'rss MB':>7}")
+    print(header)
+    measurements = []
+    for agents in [int(value) for value in args.agents.split(",")]:
+        for tasks in [int(value) for value in args.tasks.split(",")]:
+            result = run_scenario(args, agents, tasks)
+            runs = agents * tasks
+            ideal = math.ceil(runs / args.max_concurrent) * (args.latency + startup)
+            agent_overheads = [wall - args.latency - startup for wall in result["agent_wall_seconds"]]
+            print(f"{agents:>6} {tasks:>6} {result['wall_seconds']:>8.2f} {ideal:>8.2f} "
+                  f"{ideal / result['wall_seconds']:>6.2f} {tasks / result['wall_seconds']:>8.1f} "
+                  f"{runs / result['wall_seconds']:>8.1f} "
+                  f"{percentile(result['orchestration_overheads'], 0.5) * 1000:>15.1f} "
+                  f"{percentile(agent_overheads, 0.5) * 1000:>16.1f} "
+                  f"{percentile(result['spawn_seconds'], 0.95) * 1000:>12.2f} "
+                  f"{percentile(result['queue_wait_seconds'], 0.95):>11.2f} "
+                  f"{result['peak_rss_kb'] / 1024:>7.1f}")
+            measurements.append({"agents": agents, "tasks": tasks, "ideal_seconds": ideal, **result})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"fake_agent_startup_seconds": startup, "args": vars(args), "scenarios": measurements}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
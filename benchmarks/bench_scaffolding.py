@@ -0,0 +1,63 @@
+"""
+Compares project scaffolding from the cached template skeleton against the
+original path that renders every project from config.json.
+
+Usage:
+    python benchmarks/bench_scaffolding.py --projects 1000 --project-type defi
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+def run_case(orchestrator, label, workspace, project_type, projects, **config):
+    orchestrator.CONFIG.update(config)
+    case_dir = os.path.join(workspace, label)
+    # Compile the skeleton outside of the timed section, as a warm orchestrator would have
+    orchestrator.create_project_structure(os.path.join(case_dir, "warmup"), project_type)
+    start = time.perf_counter()
+    for i in range(projects):
+        if not orchestrator.create_project_structure(os.path.join(case_dir, f"project-{i}"), project_type):
+            raise RuntimeError(f"Scaffolding failed in case {label}")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {projects:>8} {elapsed:>10.3f} {elapsed / projects * 1e6:>12.1f} {projects / elapsed:>12.1f}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark project scaffolding.")
+    parser.add_argument("--projects", type=int, default=500, help="Projects to create per case.")
+    parser.add_argument("--project-type", default="revolution", help="Project template to scaffold.")
+    parser.add_argument("--config", default=os.path.join(REPO_DIR, "config.json"), help="Configuration file to use.")
+    parser.add_argument("--workspace", help="Directory to scaffold into (on the filesystem to measure). Defaults to a temp dir.")
+    args = parser.parse_args()
+
+    workspace = tempfile.mkdtemp(prefix="bench-scaffolding-", dir=args.workspace)
+    os.chdir(workspace) # Keep orchestrator.log out of the repository
+    import crypto_ai_orchestrator as orchestrator
+    orchestrator.logger.setLevel(logging.WARNING)
+    orchestrator.load_config(args.config)
+    skeleton_cache_dir = os.path.join(workspace, "skeleton-cache")
+
+    try:
+        print(f"{'case':<10} {'projects':>8} {'total s':>10} {'us/project':>12} {'projects/s':>12}")
+        baseline = run_case(orchestrator, "uncached", workspace, args.project_type, args.projects,
+                            skeleton_cache_enabled=False)
+        for link_mode in ["copy", "reflink", "hardlink"]:
+            elapsed = run_case(orchestrator, link_mode, workspace, args.project_type, args.projects,
+                               skeleton_cache_enabled=True, skeleton_cache_dir=skeleton_cache_dir,
+                               skeleton_link_mode=link_mode)
+            print(f"{'':<10} speedup vs uncached: {baseline / elapsed:.2f}x")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Stand-in for a real agent (smol-developer, aider, shell-gpt) in benchmarks.
+
+It needs no network or model: it sleeps for a tunable latency, writes a tunable
+amount of output, optionally writes files into the project, and exits with a
+chosen code, fails at random or hangs.
+
+Usage (as an argv template in the agent registry):
+    fake_agent.py --task "{task}" --latency 0.5 --output-bytes 1000000 --fail-rate 0.1
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import time
+
+CHUNK = b"x" * 1023 + b"\n"
+
+
+def write_bytes(stream, count):
+    while count > 0:
+        chunk = CHUNK[:count]
+        stream.write(chunk)
+        count -= len(chunk)
+    stream.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake agent for orchestrator benchmarks.")
+    parser.add_argument("--task", default="", help="Accepted like a real agent's task; only echoed.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of simulated work.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency, up to this many seconds.")
+    parser.add_argument("--output-bytes", type=int, default=0, help="Bytes written to stdout, spread over the run.")
+    parser.add_argument("--stderr-bytes", type=int, default=0, help="Bytes written to stderr.")
+    parser.add_argument("--write-files", type=int, default=0, help="Files written into src/ of the working directory.")
+    parser.add_argument("--exit-code", type=int, default=0, help="Exit code on completion.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability of exiting with code 1 instead.")
+    parser.add_argument("--hang", action="store_true", help="Never finish (until killed).")
+    parser.add_argument("--ignore-sigterm", action="store_true", help="Ignore SIGTERM, so only SIGKILL stops it.")
+    args = parser.parse_args()
+
+    if args.ignore_sigterm:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    print(f"fake agent {os.getpid()} starting task: {args.task}", flush=True)
+    latency = args.latency + random.uniform(0, args.jitter)
+    # Interleave output with the simulated work, like a real agent streaming its progress
+    steps = max(1, min(10, args.output_bytes // len(CHUNK)))
+    for _ in range(steps):
+        write_bytes(sys.stdout.buffer, args.output_bytes // steps)
+        time.sleep(latency / steps)
+    write_bytes(sys.stderr.buffer, args.stderr_bytes)
+
+    for i in range(args.write_files):
+        os.makedirs("src", exist_ok=True)
+        with open(os.path.join("src", f"fake_{os.getpid()}_{i}.py"), "w") as f:
+            f.write(f"# generated for: {args.task}\n")
+
+    while args.hang:
+        time.sleep(3600)
+
+    if random.random() < args.fail_rate:
+        print("fake agent simulated failure", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(args.exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,16 +32,21 @@ fi
 # shellcheck source=/dev/null
 source "$VENV_DIR/bin/activate"
 
-# Install dependencies from requirements.txt
+# Install dependencies from requirements.txt, only when it changed since the last install
+REQUIREMENTS_STAMP="$VENV_DIR/.requirements.installed"
 if [ -f "$SCRIPT_DIR/requirements.txt" ]; then
-    pip install -r "$SCRIPT_DIR/requirements.txt"
-    if [ $? -ne 0 ]; then
-        echo "Error: Failed to install dependencies from requirements.txt."
-        exit 1
+    if [ ! -f "$REQUIREMENTS_STAMP" ] || [ "$SCRIPT_DIR/requirements.txt" -nt "$REQUIREMENTS_STAMP" ]; then
+        pip install -r "$SCRIPT_DIR/requirements.txt"
+        if [ $? -ne 0 ]; then
+            echo "Error: Failed to install dependencies from requirements.txt."
+            exit 1
+        fi
+        touch "$REQUIREMENTS_STAMP"
     fi
 else
     echo "Warning: requirements.txt not found. Skipping dependency installation."
 fi
 
-# Execute the Python script with all arguments passed to this shell script
-python3 "$PYTHON_SCRIPT" "$@"
+# Execute the Python script with all arguments passed to this shell script.
+# exec replaces the shell so signals (e.g. stopping a 'serve' daemon) reach Python directly.
+exec python3 "$PYTHON_SCRIPT" "$@"
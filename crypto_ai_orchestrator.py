@@ -1,163 +1,987 @@
 import argparse
+import atexit
 import os
+import re
+import shlex
+import shutil
+import signal
+import socket
+import stat
+import sys
+import tempfile
 import json
 import subprocess
 import asyncio
+import collections
+import contextlib
+import difflib
+import errno
+import functools
+import hashlib
+import itertools
 import logging
-from datetime import datetime
+import logging.handlers
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None
+
+def configure_logging(log_file="orchestrator.log"):
+    """
+    Sends log records through a queue to the file and console handlers, which run in a
+    background listener thread, so that logging never blocks the event loop.
+    """
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s')
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Drain the queue on exit so the last records are not lost
+    atexit.register(listener.stop)
+    return listener
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(levelname)s: %(message)s',
-    handlers=[
-        logging.FileHandler("orchestrator.log"),
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
 # Configuration (can be loaded from a file later)
 CONFIG = {}
+CONFIG_PATH = "config.json"
+
+# Agents known without an "agents" section in config.json. External agents are
+# launched from an argv template ({task}, {project_path} and {agent} are expanded);
+# builtin agents run in-process through the functions registered in BUILTIN_AGENTS.
+DEFAULT_AGENT_REGISTRY = {
+    "smol-developer": {"argv": ["smol-developer", "--task", "{task}", "--path", "{project_path}"]},
+    "aider": {"argv": ["aider", "--message", "{task}", "--dir", "{project_path}"]},
+    "shell-gpt": {"argv": ["shell-gpt", "--prompt", "{task}", "--output-dir", "{project_path}"]},
+    "quantum-agent": {"builtin": "quantum-agent"},
+    "xuabgicos-agent": {"builtin": "xuabgicos-agent"},
+    "review-agent": {"builtin": "review-agent"},
+}
+BUILTIN_AGENTS = {}
+
+# Orchestration history database, stored in the memory directory
+HISTORY_DB_NAME = "history.db"
+
+# Shared agent context database, stored in each project's memory directory
+CONTEXT_DB_NAME = "context.db"
+
+# Folders created in every project, and the requirements file written into it
+DEFAULT_PROJECT_FOLDERS = ["src", "tests", "docs", "logs", "memory"]
+PROJECT_REQUIREMENTS = "smol-developer\naider-chat\nshell-gpt\n"
+
+# Compiled project skeletons, keyed by the hash of their template; bump the
+# format version whenever the skeleton layout rules change
+SKELETON_FORMAT_VERSION = 1
+_SKELETONS = {}
+
+# ioctl request used to reflink (clone) a file on Btrfs/XFS
+FICLONE = 0x40049409
+
+# Per-agent metrics stored in the orchestration record and summarized by 'stats'
+STATS_AGENT_METRICS = ["queue_wait_seconds", "spawn_seconds", "wall_seconds", "cpu_user_seconds",
+                       "cpu_system_seconds", "max_rss_kb", "stdout_bytes", "stderr_bytes"]
+STATS_QUANTILES = (0.5, 0.95, 0.99)
+# How the process metrics of retried attempts add up in an agent's record
+ATTEMPT_SUMMED_METRICS = ("spawn_seconds", "cpu_user_seconds", "cpu_system_seconds", "stdout_bytes", "stderr_bytes")
+ATTEMPT_MAX_METRICS = ("max_rss_kb",)
+
+# Interval at which the peak RSS of running agents is sampled from /proc
+RSS_SAMPLE_SECONDS = 0.5
+
+# Finished daemon jobs kept in memory for status requests
+DAEMON_MAX_TRACKED_JOBS = 1000
+
+# Size of the reads used when streaming agent output to disk
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# Per-agent workspaces of isolated runs, inside the project
+AGENT_WORKSPACES_DIR = ".workspaces"
+
+# Project folders that are not agent inputs or outputs (logs, shared context and agent workspaces)
+TREE_MANIFEST_EXCLUDES = ("logs", "memory", AGENT_WORKSPACES_DIR)
 
-def load_config(config_path="config.json"):
+# Bump when the result cache key or entry layout changes
+RESULT_CACHE_FORMAT_VERSION = 1
+
+# Subdirectories of the worker job queue, one per job state
+QUEUE_STATES = ("pending", "leased", "done", "failed")
+
+# Thread pool for file and database work done on behalf of the event loop
+_IO_EXECUTOR = None
+# Separate pool for whole-tree work (snapshots, merges, hashing, cache entries, scaffolding),
+# so that it cannot hold up log writes, agent spawns or lease heartbeats
+_BULK_IO_EXECUTOR = None
+
+def load_config(config_path=None):
     global CONFIG
+    config_path = config_path or CONFIG_PATH
     try:
         with open(config_path, 'r') as f:
             CONFIG = json.load(f)
+        # The configuration may declare different agents or PATH entries
+        resolve_agent_binary.cache_clear()
         logger.info(f"Configuration loaded from {config_path}")
     except FileNotFoundError:
         logger.warning(f"Config file {config_path} not found. Using default empty config.")
     except json.JSONDecodeError:
         logger.error(f"Error decoding JSON from {config_path}. Using default empty config.")
 
+def builtin_agent(name):
+    """
+    Registers a coroutine function as the in-process implementation of an agent.
+    """
+    def register(fn):
+        BUILTIN_AGENTS[name] = fn
+        return fn
+    return register
+
+def get_agent_spec(agent_name):
+    """
+    Returns the registry entry of an agent: config.json "agents" overriding DEFAULT_AGENT_REGISTRY.
+    """
+    return CONFIG.get("agents", {}).get(agent_name, DEFAULT_AGENT_REGISTRY.get(agent_name))
+
+def agent_setting(spec, key, default=None):
+    """
+    Returns an execution setting of an agent: its registry entry, then the global config value.
+    """
+    return (spec or {}).get(key, CONFIG.get(key, default))
+
+@functools.lru_cache(maxsize=None)
+def resolve_agent_binary(executable):
+    """
+    Resolves an agent executable to its full path once per process (None if not found).
+    """
+    return shutil.which(executable)
+
+def _expand_agent_placeholders(value, agent_name, task, project_path):
+    # Single pass, so placeholders inside the task itself are left untouched
+    values = {"agent": agent_name, "task": task, "project_path": project_path}
+    return re.sub(r"\{(agent|task|project_path)\}", lambda match: values[match.group(1)], value)
+
+def build_agent_argv(spec, agent_name, task, project_path):
+    """
+    Expands an agent's argv template, with the executable resolved to its cached full path.
+    """
+    argv = [_expand_agent_placeholders(arg, agent_name, task, project_path) for arg in spec["argv"]]
+    argv[0] = resolve_agent_binary(argv[0]) or argv[0]
+    return argv
+
 def check_agent_availability(agent_name):
-    import shutil
-    if shutil.which(agent_name):
+    spec = get_agent_spec(agent_name)
+    if spec is None:
+        logger.warning(f"Agent '{agent_name}' is not declared in the agent registry.")
+        return False
+    if "builtin" in spec:
+        if spec["builtin"] in BUILTIN_AGENTS:
+            return True
+        logger.warning(f"Agent '{agent_name}' refers to unknown builtin '{spec['builtin']}'.")
+        return False
+    if resolve_agent_binary(spec["argv"][0]):
         return True
     else:
         logger.warning(f"Agent '{agent_name}' not found in system PATH. Please install it.")
         return False
 
-async def run_agent(agent_name, task, project_path):
+def _io_executor():
+    global _IO_EXECUTOR
+    if _IO_EXECUTOR is None:
+        _IO_EXECUTOR = ThreadPoolExecutor(max_workers=CONFIG.get("io_threads", 4),
+                                          thread_name_prefix="orchestrator-io")
+    return _IO_EXECUTOR
+
+async def run_io(fn, *args, **kwargs):
     """
-    Runs an AI agent asynchronously.
+    Runs a blocking file or database call in the I/O thread pool and awaits its result.
     """
-    logger.info(f"Starting agent: {agent_name} for task: '{task}' in project: {project_path}")
-    command = ""
-    if agent_name == "smol-developer":
-        command = f"smol-developer --task \"{task}\" --path \"{project_path}\""
-    elif agent_name == "aider":
-        command = f"aider --message \"{task}\" --dir \"{project_path}\""
-    elif agent_name == "shell-gpt":
-        command = f"shell-gpt --prompt \"{task}\" --output-dir \"{project_path}\""
-    elif agent_name == "quantum-agent": # Conceptual Quantum Agent
-        logger.info(f"Simulating quantum agent execution for task: '{task}'")
-        # In a real scenario, this would involve calling a quantum computing SDK or API
-        # For now, we'll just simulate a delay and success/failure
-        await asyncio.sleep(5) # Simulate work
-        if "fail" in task.lower():
-            logger.warning(f"Quantum agent simulated failure for task: '{task}'")
-            return False
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor(), functools.partial(fn, *args, **kwargs))
+
+def _bulk_io_executor():
+    global _BULK_IO_EXECUTOR
+    if _BULK_IO_EXECUTOR is None:
+        _BULK_IO_EXECUTOR = ThreadPoolExecutor(max_workers=CONFIG.get("bulk_io_threads", 2),
+                                               thread_name_prefix="orchestrator-bulk-io")
+    return _BULK_IO_EXECUTOR
+
+async def run_bulk_io(fn, *args, **kwargs):
+    """
+    Like run_io, for work over whole project trees, in the bulk I/O thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bulk_io_executor(), functools.partial(fn, *args, **kwargs))
+
+class AgentLogWriter:
+    """
+    Per-agent log file whose writes run in the I/O thread pool.
+
+    Both output pumps of an agent share one writer; a lock keeps each section
+    marker together with the chunk that follows it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._current_label = None
+
+    async def open(self, header_lines):
+        await run_io(self._open, header_lines)
+        return self
+
+    def _open(self, header_lines):
+        self._file = open(self.path, "wb")
+        self._file.write("".join(f"{line}\n" for line in header_lines).encode())
+        self._file.flush()
+
+    def _write_output(self, label, chunk):
+        with self._lock:
+            if self._current_label != label:
+                self._file.write(f"\n--- {label} ---\n".encode())
+                self._current_label = label
+            self._file.write(chunk)
+            self._file.flush()
+
+    async def write_output(self, label, chunk):
+        await run_io(self._write_output, label, chunk)
+
+    def _close(self, footer_lines):
+        with self._lock:
+            self._file.write("".join(f"\n{line}\n" for line in footer_lines).encode())
+            self._file.close()
+
+    async def close(self, *footer_lines):
+        await run_io(self._close, footer_lines)
+
+class LoopStallMonitor:
+    """
+    Debug aid that reports when the event loop is blocked for longer than `threshold` seconds.
+
+    A heartbeat task measures how late it is woken up; asyncio debug mode additionally
+    names the slow callback responsible.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.stalls = 0
+        self.worst = 0.0
+        self._task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.threshold
+        # Keep the slow-callback warnings, not debug mode's chatter about transports
+        logging.getLogger("asyncio").setLevel(logging.WARNING)
+        self._task = loop.create_task(self._heartbeat())
+        logger.info(f"Event loop stall monitor enabled (threshold {self.threshold * 1000:.0f} ms).")
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        interval = self.threshold / 2
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = loop.time() - expected
+            if lag > self.threshold:
+                self.stalls += 1
+                self.worst = max(self.worst, lag)
+                logger.warning(f"Event loop stalled for {lag * 1000:.1f} ms")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        logger.info(f"Event loop stall monitor: {self.stalls} stall(s) above {self.threshold * 1000:.0f} ms, "
+                    f"worst {self.worst * 1000:.1f} ms.")
+
+class AgentScheduler:
+    """
+    Bounded worker pool placed in front of run_agent.
+
+    At most `max_workers` agents run at once and each agent name is further
+    capped by `per_agent_limits`. Waiting runs are granted by task priority,
+    then agent priority (higher first); among equal priorities the task that
+    has been served the least goes first, so one large task cannot starve the
+    others.
+    """
+
+    def __init__(self, max_workers, per_agent_limits=None, agent_priorities=None):
+        self.max_workers = max(1, int(max_workers))
+        self.per_agent_limits = per_agent_limits or {}
+        self.agent_priorities = agent_priorities or {}
+        self._waiting = []
+        self._running = 0
+        self._running_by_agent = {}
+        self._running_by_task = {}
+        self._served_by_task = {}
+        self._sequence = itertools.count()
+
+    def _has_capacity(self, agent_name):
+        limit = self.per_agent_limits.get(agent_name)
+        return limit is None or self._running_by_agent.get(agent_name, 0) < limit
+
+    def _dispatch(self):
+        # Drop requests whose waiter was cancelled before being granted
+        self._waiting = [request for request in self._waiting if not request["future"].done()]
+        while self._running < self.max_workers:
+            eligible = [request for request in self._waiting if self._has_capacity(request["agent"])]
+            if not eligible:
+                return
+            request = min(eligible, key=lambda r: (
+                -r["priority"],
+                -self.agent_priorities.get(r["agent"], 0),
+                self._served_by_task.get(r["task_key"], 0),
+                r["sequence"],
+            ))
+            self._waiting.remove(request)
+            self._running += 1
+            self._running_by_agent[request["agent"]] = self._running_by_agent.get(request["agent"], 0) + 1
+            self._running_by_task[request["task_key"]] = self._running_by_task.get(request["task_key"], 0) + 1
+            self._served_by_task[request["task_key"]] = self._served_by_task.get(request["task_key"], 0) + 1
+            request["future"].set_result(time.monotonic() - request["queued_at"])
+
+    def _forget_task(self, task_key):
+        # Long-running processes (serve, worker) see an unbounded number of tasks
+        if self._running_by_task.get(task_key) or any(r["task_key"] == task_key for r in self._waiting):
+            return
+        self._running_by_task.pop(task_key, None)
+        self._served_by_task.pop(task_key, None)
+
+    def _release(self, request):
+        self._running -= 1
+        self._running_by_agent[request["agent"]] -= 1
+        self._running_by_task[request["task_key"]] -= 1
+        self._forget_task(request["task_key"])
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, agent_name, task_key=None, priority=0):
+        """
+        Waits for a worker slot and yields the time spent queued, in seconds.
+        """
+        request = {
+            "agent": agent_name,
+            "task_key": task_key,
+            "priority": int(priority or 0),
+            "sequence": next(self._sequence),
+            "queued_at": time.monotonic(),
+            "future": asyncio.get_running_loop().create_future(),
+        }
+        self._waiting.append(request)
+        try:
+            self._dispatch()
+            queue_wait = await request["future"]
+        except BaseException:
+            # A request left in the queue would break every later dispatch
+            self._waiting = [r for r in self._waiting if r is not request]
+            if request["future"].done() and not request["future"].cancelled():
+                self._release(request)
+            else:
+                self._forget_task(task_key)
+            raise
+        try:
+            yield queue_wait
+        finally:
+            self._release(request)
+
+def build_scheduler():
+    """
+    Creates an AgentScheduler from the loaded configuration.
+    """
+    return AgentScheduler(
+        CONFIG.get("max_concurrent_tasks", 5),
+        per_agent_limits=CONFIG.get("agent_concurrency_limits", {}),
+        agent_priorities=CONFIG.get("agent_priorities", {}),
+    )
+
+def _should_retry(spec, details):
+    """
+    Whether a failed run is worth retrying: a timeout (retry_on_timeout) or an exit code
+    listed in retry_on_exit_codes (any failure when no list is configured).
+    """
+    if details.get("timed_out"):
+        return bool(agent_setting(spec, "retry_on_timeout", True))
+    exit_codes = agent_setting(spec, "retry_on_exit_codes")
+    return exit_codes is None or details.get("exit_code") in exit_codes
+
+def _add_attempt_metrics(details, attempt_metrics):
+    """
+    Folds one attempt's process metrics into the agent's totals: resource usage is
+    summed (peak RSS is the maximum) over attempts, like the wall and queue times.
+    """
+    for key, value in attempt_metrics.items():
+        if key in ATTEMPT_SUMMED_METRICS:
+            details[key] = round(details.get(key, 0) + value, 6)
+        elif key in ATTEMPT_MAX_METRICS:
+            details[key] = max(details.get(key, 0), value)
         else:
-            logger.info(f"Quantum agent simulated success for task: '{task}'")
+            details[key] = value
+
+def _retry_delay(spec, attempt):
+    # Exponential backoff with jitter, so that agents failing together do not retry in lockstep
+    delay = agent_setting(spec, "retry_backoff_seconds", 2) * 2 ** (attempt - 1)
+    delay = min(delay, agent_setting(spec, "retry_backoff_max_seconds", 60))
+    return random.uniform(delay / 2, delay)
+
+class ProjectActivity:
+    """
+    Counts the runs writing into each project tree, so that a run can tell whether
+    another one may have written into the same tree while it was running.
+    """
+
+    def __init__(self):
+        self._running = {}
+        self._started = {}
+
+    def begin(self, project_path):
+        run = {"project_path": project_path, "alone": not self._running.get(project_path),
+               "started": self._started.get(project_path, 0)}
+        self._running[project_path] = self._running.get(project_path, 0) + 1
+        self._started[project_path] = run["started"] + 1
+        return run
+
+    def end(self, run):
+        """
+        Ends a run and returns whether no other run of the same project overlapped with it.
+        """
+        project_path = run["project_path"]
+        alone = run["alone"] and self._started[project_path] == run["started"] + 1
+        self._running[project_path] -= 1
+        if not self._running[project_path]:
+            del self._running[project_path]
+            del self._started[project_path]
+        return alone
+
+_PROJECT_ACTIVITY = ProjectActivity()
+
+async def run_scheduled_agent(scheduler, agent_name, task, project_path, priority=0, details=None,
+                              project_type=None, use_cache=False, workspace=None):
+    """
+    Runs an agent once the scheduler grants it a slot, or restores its result from the
+    result cache. Queue wait and cache outcome are recorded in `details`.
+
+    With an AgentWorkspace, the agent runs in a snapshot of the project taken once it
+    is granted a slot; project_path still identifies the task for queuing and caching.
+    """
+    details = details if details is not None else {}
+    spec = get_agent_spec(agent_name) or {}
+    run_path = workspace.path if workspace is not None else project_path
+    cache_key = None
+    if use_cache and "argv" in spec:
+        # Hashing and restoring project trees is disk work, kept off the event loop.
+        # Isolated agents do it under the merge lock, so that no merge lands in between.
+        async with workspace.lock if workspace is not None else contextlib.nullcontext():
+            cache_key = await run_bulk_io(result_cache_key, agent_name, spec, task, project_type, project_path)
+            restore = _PROJECT_ACTIVITY.begin(project_path)
+            try:
+                restored = await run_bulk_io(restore_cached_result, cache_key, agent_name, project_path)
+            finally:
+                _PROJECT_ACTIVITY.end(restore)
+        if restored:
+            details["cache"] = "hit"
             return True
-    elif agent_name == "xuabgicos-agent": # Conceptual Xuabgicos Agent
-        logger.info(f"Simulating xuabgicos agent execution for task: '{task}'")
-        # This agent will interact with the shared context
-        context_path = os.path.join(project_path, "memory", "context.json")
+        details["cache"] = "miss"
+
+    # Failed runs are retried up to `retries` times; the slot is released during the backoff
+    retries = int(agent_setting(spec, "retries", 0))
+    attempt = 0
+    activity = None
+    try:
+        while True:
+            attempt += 1
+            details.pop("exit_code", None)
+            details.pop("timed_out", None)
+            async with scheduler.slot(agent_name, task_key=project_path, priority=priority) as queue_wait:
+                details["queue_wait_seconds"] = round(details.get("queue_wait_seconds", 0) + queue_wait, 3)
+                logger.info(f"Agent {agent_name} waited {queue_wait:.3f}s in queue for project: {project_path}")
+                if activity is None:
+                    activity = _PROJECT_ACTIVITY.begin(run_path)
+                    if workspace is not None:
+                        # Taken only now, so that it includes what other agents merged while this one queued
+                        tree_before = await workspace.snapshot()
+                    elif cache_key:
+                        tree_before = await run_bulk_io(_tree_manifest, project_path)
+                    if cache_key:
+                        # Stored under the inputs the agent actually starts from
+                        cache_key = await run_bulk_io(result_cache_key, agent_name, spec, task, project_type,
+                                                 project_path, tree_before)
+                        logs_before = set(await run_io(os.listdir, os.path.join(run_path, "logs")))
+                run_start = time.monotonic()
+                attempt_metrics = {}
+                try:
+                    result = await run_agent(agent_name, task, run_path, metrics=attempt_metrics, attempt=attempt)
+                finally:
+                    _add_attempt_metrics(details, attempt_metrics)
+                details["wall_seconds"] = round(details.get("wall_seconds", 0) + time.monotonic() - run_start, 3)
+            details["attempts"] = attempt
+            if result or attempt > retries or not _should_retry(spec, details):
+                break
+            delay = _retry_delay(spec, attempt)
+            logger.warning(f"Agent {agent_name} failed (attempt {attempt} of {retries + 1}). Retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+    finally:
+        # Other agents writing into the same tree meanwhile would end up in this agent's cache entry
+        ran_alone = activity is not None and _PROJECT_ACTIVITY.end(activity)
+
+    if cache_key and result and not ran_alone:
+        logger.info(f"Not caching the result of {agent_name}: other agents wrote into {run_path} while it ran.")
+    elif cache_key and result:
         try:
-            with open(context_path, 'r+') as f:
-                context = json.load(f)
-                context['xuabgicos_observations'] = f"Symbiotic link established for task: {task}"
-                f.seek(0)
-                json.dump(context, f, indent=4)
-        except (FileNotFoundError, json.JSONDecodeError):
-            with open(context_path, 'w') as f:
-                json.dump({'xuabgicos_observations': f"Symbiotic link established for task: {task}"}, f, indent=4)
-        await asyncio.sleep(3) # Simulate work
-        logger.info(f"Xuabgicos agent simulated success for task: '{task}'")
-        return True
-    elif agent_name == "review-agent": # Conceptual Review Agent
-        logger.info(f"Simulating review agent execution for task: '{task}'")
-        # This agent will read the shared context and provide a summary
-        context_path = os.path.join(project_path, "memory", "context.json")
-        summary = "No context to review."
+            await run_bulk_io(store_cached_result, cache_key, agent_name, run_path, tree_before, logs_before)
+        except OSError as e:
+            logger.warning(f"Could not store result of {agent_name} in the result cache: {e}")
+    return result
+
+class OutputTail:
+    """
+    Ring buffer holding only the last `max_bytes` of an agent's output stream.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._chunks = collections.deque()
+        self._size = 0
+        self.total_bytes = 0
+
+    def append(self, chunk):
+        self.total_bytes += len(chunk)
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._chunks and self._size - len(self._chunks[0]) >= self.max_bytes:
+            self._size -= len(self._chunks.popleft())
+
+    def text(self):
+        return b"".join(self._chunks)[-self.max_bytes:].decode(errors="replace")
+
+class AgentProcess:
+    """
+    Agent subprocess with asyncio pipe readers, reaped with os.wait4 so that its CPU
+    time is available once it exits.
+
+    The peak RSS is sampled from VmHWM in /proc/<pid>/status while the agent runs:
+    wait4's ru_maxrss carries over the RSS of the orchestrator the agent was forked
+    from, so it would report at least the orchestrator's own peak.
+
+    Each agent leads its own session, so it and every child it starts can be
+    signalled together as one process group.
+    """
+
+    def __init__(self, popen, stdout, stderr):
+        self._popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self.rusage = None
+        self.peak_rss_kb = None
+        self._reaper = None
+
+    @classmethod
+    async def start(cls, argv, cwd=None, env=None):
+        loop = asyncio.get_running_loop()
+        # fork/exec can take tens of milliseconds, so it runs in the I/O thread pool
+        spawn = loop.run_in_executor(_io_executor(), functools.partial(
+            subprocess.Popen, argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=cwd, env=env, start_new_session=True))
+        try:
+            popen = await asyncio.shield(spawn)
+        except asyncio.CancelledError:
+            # Cancelled while spawning: wait for the process to exist, then stop it
+            with contextlib.suppress(Exception):
+                popen = await spawn
+                os.killpg(popen.pid, signal.SIGKILL)
+                popen.wait()
+            raise
+        readers = []
+        for pipe in (popen.stdout, popen.stderr):
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            readers.append(reader)
+        process = cls(popen, *readers)
+        process._sample_peak_rss() # Popen returns after exec, so this is already the agent itself
+        return process
+
+    def _sample_peak_rss(self):
+        # procfs reads do not touch the disk, so this stays on the event loop
         try:
-            with open(context_path, 'r') as f:
-                context = json.load(f)
-                summary = f"Review of shared context: {json.dumps(context, indent=2)}"
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(f"/proc/{self.pid}/status", "rb") as f:
+                for line in f:
+                    if line.startswith(b"VmHWM:"):
+                        self.peak_rss_kb = max(self.peak_rss_kb or 0, int(line.split()[1]))
+                        break
+        except (OSError, ValueError):
             pass
-        logger.info(summary)
-        await asyncio.sleep(2) # Simulate work
-        logger.info(f"Review agent simulated success for task: '{task}'")
-        return True
+
+    async def _reap(self):
+        loop = asyncio.get_running_loop()
+        try:
+            pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            # No pidfd support: block in a worker thread instead
+            _, status, rusage = await loop.run_in_executor(None, os.wait4, self.pid, 0)
+        else:
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+            try:
+                # Not reaped yet, so the pid cannot have been reused while sampling
+                while not exited.done():
+                    self._sample_peak_rss()
+                    await asyncio.wait([exited], timeout=RSS_SAMPLE_SECONDS)
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+            _, status, rusage = os.wait4(self.pid, 0)
+        self.rusage = rusage
+        self.returncode = self._popen.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    async def wait(self):
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap())
+        # Shielded so that a cancelled waiter does not abandon the reaping
+        return await asyncio.shield(self._reaper)
+
+    def signal_group(self, signum):
+        # Also reaches children left behind after the agent itself has exited
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(self.pid, signum)
+
+    def kill(self):
+        self.signal_group(signal.SIGKILL)
+
+    async def terminate(self, grace_seconds):
+        """
+        Sends SIGTERM to the agent's process group and SIGKILL to whatever is still
+        running after `grace_seconds`. Returns the agent's exit code.
+        """
+        self.signal_group(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.wait(), timeout=grace_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Agent process {self.pid} still running {grace_seconds}s after SIGTERM. Sending SIGKILL.")
+        finally:
+            self.kill() # Even when cancelled during the grace period
+        return await self.wait()
+
+def _process_metrics(process, tails):
+    metrics = {
+        "exit_code": process.returncode,
+        "stdout_bytes": tails["STDOUT"].total_bytes,
+        "stderr_bytes": tails["STDERR"].total_bytes,
+    }
+    if process.rusage is not None:
+        metrics["cpu_user_seconds"] = round(process.rusage.ru_utime, 3)
+        metrics["cpu_system_seconds"] = round(process.rusage.ru_stime, 3)
+    if process.peak_rss_kb is not None:
+        metrics["max_rss_kb"] = process.peak_rss_kb
+    return metrics
+
+def _echo_agent_lines(agent_name, lines):
+    # Prefix complete lines with the agent name so concurrent tails stay readable
+    for line in lines:
+        sys.stdout.write(f"[{agent_name}] {line.decode(errors='replace')}\n")
+    sys.stdout.flush()
+
+async def _pump_agent_output(stream, label, agent_name, log_writer, tail, echo=False):
+    """
+    Copies one of an agent's pipes to its log file chunk by chunk.
+    Writes (and the optional console echo) run in the I/O thread pool.
+    """
+    pending_line = b""
+    while True:
+        chunk = await stream.read(OUTPUT_CHUNK_SIZE)
+        if not chunk:
+            break
+        await log_writer.write_output(label, chunk)
+        tail.append(chunk)
+        if echo:
+            lines = (pending_line + chunk).split(b"\n")
+            pending_line = lines.pop()
+            if lines:
+                await run_io(_echo_agent_lines, agent_name, lines)
+    if echo and pending_line:
+        await run_io(_echo_agent_lines, agent_name, [pending_line])
+
+@builtin_agent("quantum-agent")
+async def _run_quantum_agent(agent_name, task, project_path): # Conceptual Quantum Agent
+    logger.info(f"Simulating quantum agent execution for task: '{task}'")
+    # In a real scenario, this would involve calling a quantum computing SDK or API
+    # For now, we'll just simulate a delay and success/failure
+    await asyncio.sleep(5) # Simulate work
+    if "fail" in task.lower():
+        logger.warning(f"Quantum agent simulated failure for task: '{task}'")
+        return False
     else:
+        logger.info(f"Quantum agent simulated success for task: '{task}'")
+        return True
+
+def _publish_xuabgicos_observation(agent_name, task, project_path):
+    store = ContextStore(project_path)
+    try:
+        return store.put("xuabgicos_observations", f"Symbiotic link established for task: {task}", agent=agent_name)
+    finally:
+        store.close()
+
+def _review_context_changes(agent_name, project_path):
+    store = ContextStore(project_path)
+    try:
+        cursor_key = f"{agent_name}:last_reviewed_version"
+        last_reviewed = store.get(cursor_key, 0)
+        changes = {entry["key"]: entry["value"] for entry in store.changes_since(last_reviewed) if entry["key"] != cursor_key}
+        if not changes:
+            return "No context to review."
+        store.put(cursor_key, store.current_version(), agent=agent_name)
+        return f"Review of shared context changes since version {last_reviewed}: {json.dumps(changes, indent=2)}"
+    finally:
+        store.close()
+
+@builtin_agent("xuabgicos-agent")
+async def _run_xuabgicos_agent(agent_name, task, project_path): # Conceptual Xuabgicos Agent
+    logger.info(f"Simulating xuabgicos agent execution for task: '{task}'")
+    # This agent will interact with the shared context
+    version = await run_io(_publish_xuabgicos_observation, agent_name, task, project_path)
+    logger.info(f"Xuabgicos agent published shared context version {version}")
+    await asyncio.sleep(3) # Simulate work
+    logger.info(f"Xuabgicos agent simulated success for task: '{task}'")
+    return True
+
+@builtin_agent("review-agent")
+async def _run_review_agent(agent_name, task, project_path): # Conceptual Review Agent
+    logger.info(f"Simulating review agent execution for task: '{task}'")
+    # This agent reviews only the shared context entries changed since its last review
+    summary = await run_io(_review_context_changes, agent_name, project_path)
+    logger.info(summary)
+    await asyncio.sleep(2) # Simulate work
+    logger.info(f"Review agent simulated success for task: '{task}'")
+    return True
+
+async def run_agent(agent_name, task, project_path, metrics=None, attempt=1):
+    """
+    Runs an AI agent asynchronously, as declared in the agent registry.
+    Process metrics of external agents are added to `metrics` when given.
+    """
+    logger.info(f"Starting agent: {agent_name} for task: '{task}' in project: {project_path}")
+    spec = get_agent_spec(agent_name)
+    if spec is None:
         logger.error(f"Unknown agent: {agent_name}")
         return False
+    if "builtin" in spec:
+        return await BUILTIN_AGENTS[spec["builtin"]](agent_name, task, project_path)
 
+    argv = build_agent_argv(spec, agent_name, task, project_path)
+    command = shlex.join(argv)
+    env = None
+    if spec.get("env"):
+        env = {**os.environ, **{key: _expand_agent_placeholders(str(value), agent_name, task, project_path)
+                                for key, value in spec["env"].items()}}
+
+    attempt_suffix = f"_attempt{attempt}" if attempt > 1 else ""
+    log_file_name = f"{agent_name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}{attempt_suffix}.log"
+    log_file_path = os.path.join(project_path, "logs", log_file_name)
     try:
         logger.info(f"Executing command for {agent_name}: {command}")
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=project_path
-        )
+        spawn_start = time.monotonic()
+        process = await AgentProcess.start(argv, cwd=project_path, env=env)
+        if metrics is not None:
+            metrics["spawn_seconds"] = round(time.monotonic() - spawn_start, 6)
+
+        # Per-agent timeout, falling back to the global one (600 seconds if not in config)
+        timeout = agent_setting(spec, "timeout_seconds", 600)
+        grace = agent_setting(spec, "kill_grace_seconds", 10)
+        tail_bytes = int(CONFIG.get("output_tail_kb", 16) * 1024)
+        tails = {"STDOUT": OutputTail(tail_bytes), "STDERR": OutputTail(tail_bytes)}
+        echo = CONFIG.get("stream_agent_output", False)
+        timed_out = False
+
+        # Output is written to the log as it arrives; only the tails stay in memory
+        log_writer = await AgentLogWriter(log_file_path).open([
+            f"--- Agent: {agent_name} ---",
+            f"--- Task: {task} ---",
+            f"--- Command: {command} ---",
+        ])
+        async def run_to_completion():
+            # Awaited inside a coroutine so that a cancelled gather's exception is always retrieved
+            await asyncio.gather(
+                process.wait(),
+                _pump_agent_output(process.stdout, "STDOUT", agent_name, log_writer, tails["STDOUT"], echo),
+                _pump_agent_output(process.stderr, "STDERR", agent_name, log_writer, tails["STDERR"], echo),
+            )
 
-        timeout = CONFIG.get("timeout_seconds", 600) # Default to 600 seconds if not in config
         try:
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            await asyncio.wait_for(run_to_completion(), timeout=timeout)
         except asyncio.TimeoutError:
-            logger.warning(f"Agent {agent_name} timed out after {timeout} seconds. Terminating process.")
-            process.kill()
-            stdout, stderr = await process.communicate() # Get any output before termination
-            log_file_name = f"{agent_name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}_timeout.log"
-            log_file_path = os.path.join(project_path, "logs", log_file_name)
-
-            with open(log_file_path, "w") as f:
-                f.write(f"--- Agent: {agent_name} (TIMED OUT) ---\n")
-                f.write(f"--- Task: {task} ---\n")
-                f.write(f"--- Command: {command} ---\n")
-                f.write(f"--- Timeout: {timeout} seconds ---\n")
-                f.write(f"--- Exit Code: {process.returncode} (likely -9 for killed process) ---\n")
-                if stdout:
-                    f.write(f"--- STDOUT (before timeout) ---\n{stdout.decode()}\n")
-                if stderr:
-                    f.write(f"--- STDERR (before timeout) ---\n{stderr.decode()}\n")
-            logger.info(f"Agent {agent_name} logs (including timeout info) saved to {log_file_path}")
-            return False # Agent failed due to timeout
+            timed_out = True
+            logger.warning(f"Agent {agent_name} timed out after {timeout} seconds. Terminating process group.")
+            await process.terminate(grace)
+        except asyncio.CancelledError:
+            # The orchestration was cancelled: do not leave the agent or its children running
+            logger.warning(f"Agent {agent_name} cancelled. Terminating process group.")
+            await process.terminate(grace)
+            await log_writer.close("--- CANCELLED ---")
+            raise
+
+        footer = [f"--- TIMED OUT after {timeout} seconds ---"] if timed_out else []
+        await log_writer.close(*footer, f"--- Exit Code: {process.returncode} ---")
 
-        log_file_name = f"{agent_name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}.log"
-        log_file_path = os.path.join(project_path, "logs", log_file_name)
+        if metrics is not None:
+            metrics.update(_process_metrics(process, tails))
+            if timed_out:
+                metrics["timed_out"] = True
 
-        with open(log_file_path, "w") as f:
-            f.write(f"--- Agent: {agent_name} ---\n")
-            f.write(f"--- Task: {task} ---\n")
-            f.write(f"--- Command: {command} ---\n")
-            f.write(f"--- Exit Code: {process.returncode} ---\n")
-            if stdout:
-                f.write(f"--- STDOUT ---\n{stdout.decode()}\n")
-            if stderr:
-                f.write(f"--- STDERR ---\n{stderr.decode()}\n")
+        if timed_out:
+            timeout_log_file_path = log_file_path[:-len(".log")] + "_timeout.log"
+            await run_io(os.replace, log_file_path, timeout_log_file_path)
+            logger.info(f"Agent {agent_name} logs (including output before timeout) saved to {timeout_log_file_path}")
+            return False # Agent failed due to timeout
 
         logger.info(f"Agent {agent_name} finished with exit code {process.returncode}. Logs saved to {log_file_path}")
 
         if process.returncode != 0:
+            summary = tails["STDERR"].text() or tails["STDOUT"].text()
             logger.error(f"Agent {agent_name} failed. Check logs for details.")
+            if summary:
+                logger.error(f"Last output from {agent_name}:\n{summary}")
             return False
         return True
     except Exception as e:
         logger.error(f"Error running agent {agent_name}: {e}")
         return False
 
-def create_project_structure(project_path, project_type):
+class ContextStore:
     """
-    Creates the basic project directory structure and files based on project type.
+    Versioned key/value context shared by the agents of a project, kept in memory/context.db.
+
+    Each update is an atomic per-key write that bumps a project-wide version, so
+    agents can read a single key or only the entries changed since a version
+    they have already seen, instead of rewriting or re-reading the whole context.
+    """
+
+    def __init__(self, project_path):
+        memory_path = os.path.join(project_path, "memory")
+        os.makedirs(memory_path, exist_ok=True)
+        self.db_path = os.path.join(memory_path, CONTEXT_DB_NAME)
+        # Transactions are managed explicitly so writers can take the lock up front
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                agent TEXT,
+                updated_at TEXT
+            )
+        """)
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_version ON entries(version)")
+        self._import_legacy_context(os.path.join(memory_path, "context.json"))
+
+    def close(self):
+        self._conn.close()
+
+    @contextlib.contextmanager
+    def _write_transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _write(self, key, value, agent):
+        version = self._conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM entries").fetchone()[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, version, agent, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(value), version, agent, datetime.now().isoformat()),
+        )
+        return version
+
+    def _import_legacy_context(self, context_path):
+        # Carry over the context.json written by older versions, once
+        if not os.path.exists(context_path):
+            return
+        with self._write_transaction():
+            if self._conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+                return
+            try:
+                with open(context_path, 'r') as f:
+                    legacy_context = json.load(f)
+            except (IOError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable legacy context file {context_path}: {e}")
+                return
+            for key, value in legacy_context.items():
+                self._write(key, value, "legacy-import")
+
+    def put(self, key, value, agent=None):
+        """
+        Sets a key and returns the new context version.
+        """
+        with self._write_transaction():
+            return self._write(key, value, agent)
+
+    def update(self, key, update_fn, default=None, agent=None):
+        """
+        Atomically replaces a key with update_fn(current_value) and returns (new_value, version).
+        """
+        with self._write_transaction():
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            value = update_fn(json.loads(row[0]) if row else default)
+            return value, self._write(key, value, agent)
+
+    def get_entry(self, key):
+        row = self._conn.execute(
+            "SELECT key, value, version, agent, updated_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def get(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def changes_since(self, version=0):
+        """
+        Returns the entries written after `version`, oldest first.
+        """
+        rows = self._conn.execute(
+            "SELECT key, value, version, agent, updated_at FROM entries WHERE version > ? ORDER BY version",
+            (version,),
+        )
+        return [self._entry(row) for row in rows]
+
+    def current_version(self):
+        return self._conn.execute("SELECT COALESCE(MAX(version), 0) FROM entries").fetchone()[0]
+
+    def snapshot(self):
+        return {entry["key"]: entry["value"] for entry in self.changes_since(0)}
+
+    @staticmethod
+    def _entry(row):
+        return {"key": row[0], "value": json.loads(row[1]), "version": row[2], "agent": row[3], "updated_at": row[4]}
+
+def _create_project_structure_uncached(project_path, project_type):
+    """
+    Creates the project directory structure and files by rendering the template from CONFIG.
     """
-    logger.info(f"Creating project structure for type: {project_type} at {project_path}")
     try:
         os.makedirs(project_path, exist_ok=True)
     except OSError as e:
@@ -165,8 +989,7 @@ def create_project_structure(project_path, project_type):
         return False
 
     # Default structure
-    default_structure = ["src", "tests", "docs", "logs", "memory"]
-    for folder in default_structure:
+    for folder in DEFAULT_PROJECT_FOLDERS:
         try:
             os.makedirs(os.path.join(project_path, folder), exist_ok=True)
         except OSError as e:
@@ -216,9 +1039,7 @@ def create_project_structure(project_path, project_type):
 
             try:
                 with open(file_path, "w") as f:
-                    file_extension = os.path.splitext(file_name)[1]
-                    initial_content = CONFIG.get("initial_file_contents", {}).get(file_extension, CONFIG.get("initial_file_contents", {}).get("default", f"# Initial content for {file_name}\n"))
-                    f.write(initial_content.format(file_name=file_name))
+                    f.write(_initial_file_content(file_name))
             except IOError as e:
                 logger.error(f"Error writing file {file_path}: {e}")
                 return False
@@ -226,13 +1047,10 @@ def create_project_structure(project_path, project_type):
     # Create README.md and requirements.txt
     try:
         with open(os.path.join(project_path, "README.md"), "w") as f:
-            f.write(f"# {os.path.basename(project_path)} - Crypto AI Orchestrator Project\n\n")
-            f.write("This project was generated by the Crypto AI Orchestrator.\n")
+            f.write(_project_readme_content(project_path))
 
         with open(os.path.join(project_path, "requirements.txt"), "w") as f:
-            f.write("smol-developer\n")
-            f.write("aider-chat\n")
-            f.write("shell-gpt\n")
+            f.write(PROJECT_REQUIREMENTS)
     except IOError as e:
         logger.error(f"Error writing README.md or requirements.txt in {project_path}: {e}")
         return False
@@ -240,7 +1058,1355 @@ def create_project_structure(project_path, project_type):
     logger.info(f"Project structure created successfully.")
     return True
 
+def _initial_file_content(file_name):
+    initial_file_contents = CONFIG.get("initial_file_contents", {})
+    file_extension = os.path.splitext(file_name)[1]
+    initial_content = initial_file_contents.get(file_extension, initial_file_contents.get("default", f"# Initial content for {file_name}\n"))
+    # Only {file_name} is substituted so that templates may contain other braces (e.g. Solidity)
+    return initial_content.replace("{file_name}", file_name)
+
+def _project_readme_content(project_path):
+    return (f"# {os.path.basename(project_path)} - Crypto AI Orchestrator Project\n\n"
+            "This project was generated by the Crypto AI Orchestrator.\n")
+
+def _project_skeleton_layout(project_type):
+    """
+    Returns the directories and files (relative path -> content) of a project type,
+    following the same placement rules as _create_project_structure_uncached.
+    """
+    directories = list(DEFAULT_PROJECT_FOLDERS)
+    files = {}
+    template = CONFIG.get("project_templates", {}).get(project_type)
+    if template:
+        file_to_subdir_map = template.get("file_to_subdir_map", {})
+        directories.extend(os.path.join("src", sub_folder) for sub_folder in template["structure"])
+        for file_name in template["files"]:
+            target_subdir = file_to_subdir_map.get(file_name)
+            if target_subdir:
+                if file_name.endswith(".md") and target_subdir != "paradigms":
+                    target_dir = "docs"
+                else:
+                    target_dir = os.path.join("src", target_subdir)
+            else:
+                target_dir = os.path.join("src", "core")
+                logger.warning(f"No specific subdirectory mapped for {file_name}. Placing in {target_dir}")
+            directories.append(target_dir)
+            files[os.path.join(target_dir, file_name)] = _initial_file_content(file_name)
+    files["requirements.txt"] = PROJECT_REQUIREMENTS
+    # Include every parent folder; sorting puts parents before their children
+    expanded = set()
+    for directory in directories:
+        while directory and directory not in expanded:
+            expanded.add(directory)
+            directory = os.path.dirname(directory)
+    return sorted(expanded), files
+
+def _skeleton_key(project_type):
+    # Any change to the inputs of the layout yields a new key, invalidating the old skeleton
+    inputs = {
+        "format": SKELETON_FORMAT_VERSION,
+        "project_type": project_type,
+        "template": CONFIG.get("project_templates", {}).get(project_type),
+        "initial_file_contents": CONFIG.get("initial_file_contents", {}),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def _clone_file(src, dst):
+    """
+    Copies a file, sharing its data blocks (reflink) when the filesystem supports it.
+    """
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                return
+            except OSError:
+                pass # Not supported here (e.g. ext4 or another device): copy the data
+        shutil.copyfileobj(src_file, dst_file)
+
+def _user_cache_dir(name):
+    # Per-user (XDG) location, writable even when the orchestrator is installed system-wide
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "crypto-ai-orchestrator", name)
+
+def get_project_skeleton(project_type):
+    """
+    Returns the compiled skeleton of a project type, building it on disk on first use.
+
+    Skeletons live in skeleton_cache_dir under a name that includes a hash of the
+    template and initial file contents, so editing config.json invalidates them.
+    Skeletons of older templates are left in place, since other processes (a daemon,
+    or a run with another config) may still be using them.
+    """
+    key = _skeleton_key(project_type)
+    skeleton = _SKELETONS.get(key)
+    if skeleton and os.path.isdir(skeleton["path"]):
+        return skeleton
+    _SKELETONS.pop(key, None) # Removed from the cache directory: compile it again
+
+    directories, files = _project_skeleton_layout(project_type)
+    cache_dir = CONFIG.get("skeleton_cache_dir") or _user_cache_dir("skeletons")
+    safe_type = re.sub(r"[^A-Za-z0-9_.-]", "_", project_type)
+    skeleton_path = os.path.join(cache_dir, f"{safe_type}-{key[:16]}")
+    if not os.path.isdir(skeleton_path):
+        logger.info(f"Compiling project skeleton for type {project_type} at {skeleton_path}")
+        os.makedirs(cache_dir, exist_ok=True)
+        build_path = tempfile.mkdtemp(prefix=f".{safe_type}-", dir=cache_dir)
+        for directory in directories:
+            os.makedirs(os.path.join(build_path, directory), exist_ok=True)
+        for relative_path, content in files.items():
+            with open(os.path.join(build_path, relative_path), "w") as f:
+                f.write(content)
+        try:
+            os.rename(build_path, skeleton_path)
+        except OSError:
+            shutil.rmtree(build_path, ignore_errors=True) # Another process compiled it first
+
+    skeleton = {
+        "path": skeleton_path,
+        "directories": directories,
+        "files": [(relative_path, content.encode()) for relative_path, content in files.items()],
+    }
+    _SKELETONS[key] = skeleton
+    return skeleton
+
+def materialize_skeleton(skeleton, project_path, link_mode="copy"):
+    """
+    Creates a project from a compiled skeleton.
+
+    link_mode "copy" writes the cached file contents, "reflink" clones the skeleton
+    files (falling back to a copy), and "hardlink" links them. Hardlinked files share
+    their data with the cache, so agents editing them in place also edit the skeleton.
+    """
+    for directory in [""] + skeleton["directories"]:
+        try:
+            os.mkdir(os.path.join(project_path, directory))
+        except FileExistsError:
+            pass
+    for relative_path, content in skeleton["files"]:
+        target = os.path.join(project_path, relative_path)
+        if link_mode == "hardlink":
+            try:
+                os.link(os.path.join(skeleton["path"], relative_path), target)
+            except FileExistsError:
+                os.remove(target)
+                os.link(os.path.join(skeleton["path"], relative_path), target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                _clone_file(os.path.join(skeleton["path"], relative_path), target) # Cache on another filesystem
+        elif link_mode == "reflink":
+            _clone_file(os.path.join(skeleton["path"], relative_path), target)
+        else:
+            with open(target, "wb") as f:
+                f.write(content)
+
+def create_project_structure(project_path, project_type):
+    """
+    Creates the basic project directory structure and files based on project type.
+    """
+    logger.info(f"Creating project structure for type: {project_type} at {project_path}")
+    if not CONFIG.get("skeleton_cache_enabled", True):
+        return _create_project_structure_uncached(project_path, project_type)
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(project_path)), exist_ok=True)
+        skeleton = get_project_skeleton(project_type)
+        materialize_skeleton(skeleton, project_path, CONFIG.get("skeleton_link_mode", "copy"))
+        with open(os.path.join(project_path, "README.md"), "w") as f:
+            f.write(_project_readme_content(project_path))
+    except OSError as e:
+        # The cache is only an accelerator: render the template directly instead
+        logger.warning(f"Could not create project structure at {project_path} from skeleton: {e}. "
+                       f"Falling back to rendering the template.")
+        return _create_project_structure_uncached(project_path, project_type)
+
+    logger.info(f"Project structure created successfully.")
+    return True
+
+def _tree_manifest(root, exclude=TREE_MANIFEST_EXCLUDES):
+    """
+    Returns {relative path: sha256 of contents} for the files of a project tree,
+    skipping the top-level folders in `exclude`.
+    """
+    manifest = {}
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        with os.scandir(os.path.join(root, relative_dir)) as entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if not (relative_dir == "" and entry.name in exclude):
+                        pending.append(relative_path)
+                elif entry.is_file(follow_symlinks=False):
+                    manifest[relative_path] = _file_digest(entry.path)
+    return manifest
+
+def _result_cache_dir():
+    return CONFIG.get("result_cache_dir") or _user_cache_dir("results")
+
+def result_cache_key(agent_name, spec, task, project_type, project_path, tree=None):
+    """
+    Hashes everything that determines an agent's output: the agent and its registry
+    entry, the normalized task, the project template and the input tree (the current
+    tree of project_path unless a manifest of it is given).
+    """
+    tree = dict(tree) if tree is not None else _tree_manifest(project_path)
+    # The generated README only differs by project name, so it does not make inputs distinct
+    if tree.get("README.md") == hashlib.sha256(_project_readme_content(project_path).encode()).hexdigest():
+        del tree["README.md"]
+    inputs = {
+        "format": RESULT_CACHE_FORMAT_VERSION,
+        "agent": agent_name,
+        "spec": spec,
+        "task": " ".join(task.split()),
+        "project_type": project_type,
+        "template": CONFIG.get("project_templates", {}).get(project_type),
+        "tree": tree,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def restore_cached_result(cache_key, agent_name, project_path):
+    """
+    Applies a cached agent result (files written, files deleted and logs) to a project.
+    Returns False on a cache miss.
+    """
+    entry_path = os.path.join(_result_cache_dir(), cache_key)
+    meta_path = os.path.join(entry_path, "meta.json")
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False # Missing or unreadable: run the agent
+    try:
+        for relative_path in meta["files"]:
+            target = os.path.join(project_path, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _clone_file(os.path.join(entry_path, "files", relative_path), target)
+        for relative_path in meta["deleted"]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(project_path, relative_path))
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        for index, log_name in enumerate(meta["logs"]):
+            # Keep the _attemptN/_timeout suffix, so that the logs of a retried run stay distinct
+            match = re.fullmatch(rf"{re.escape(agent_name)}_\d{{8}}-\d{{6}}(.*)\.log", log_name)
+            suffix = match.group(1) if match else f"_{index}"
+            _clone_file(os.path.join(entry_path, "logs", log_name),
+                        os.path.join(project_path, "logs", f"{agent_name}_{timestamp}_cached{suffix}.log"))
+        os.utime(meta_path) # Marks the entry as recently used for LRU eviction
+    except OSError as e:
+        logger.warning(f"Could not restore cached result {cache_key} for {agent_name}: {e}")
+        return False
+    logger.info(f"Agent {agent_name} result restored from cache entry {cache_key[:16]} "
+                f"({len(meta['files'])} files, {len(meta['deleted'])} deletions)")
+    return True
+
+def store_cached_result(cache_key, agent_name, project_path, tree_before, logs_before):
+    """
+    Saves the files an agent changed, and its logs, as a result cache entry.
+    """
+    tree_after = _tree_manifest(project_path)
+    changed = [path for path, digest in tree_after.items() if tree_before.get(path) != digest]
+    deleted = [path for path in tree_before if path not in tree_after]
+    logs = [name for name in os.listdir(os.path.join(project_path, "logs"))
+            if name not in logs_before and name.startswith(f"{agent_name}_")]
+
+    cache_dir = _result_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    build_path = tempfile.mkdtemp(prefix=".entry-", dir=cache_dir)
+    try:
+        for relative_path in changed:
+            target = os.path.join(build_path, "files", relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _clone_file(os.path.join(project_path, relative_path), target)
+        os.makedirs(os.path.join(build_path, "logs"))
+        for log_name in logs:
+            _clone_file(os.path.join(project_path, "logs", log_name), os.path.join(build_path, "logs", log_name))
+        with open(os.path.join(build_path, "meta.json"), "w") as f:
+            json.dump({"agent": agent_name, "created_at": datetime.now().isoformat(),
+                       "files": changed, "deleted": deleted, "logs": logs}, f, indent=4)
+        os.rename(build_path, os.path.join(cache_dir, cache_key))
+    except OSError:
+        shutil.rmtree(build_path, ignore_errors=True)
+        if os.path.isdir(os.path.join(cache_dir, cache_key)):
+            return # Stored concurrently by another run with the same inputs
+        raise
+    logger.info(f"Stored result of {agent_name} in cache entry {cache_key[:16]} ({len(changed)} files)")
+    evict_result_cache()
+
+def _directory_size(path):
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dir_path, name)) for name in file_names)
+    return total
+
+def evict_result_cache():
+    """
+    Removes result cache entries older than result_cache_max_age_days, then the least
+    recently used ones until the cache fits in result_cache_max_mb.
+    """
+    cache_dir = _result_cache_dir()
+    max_age = CONFIG.get("result_cache_max_age_days", 30) * 86400
+    max_bytes = CONFIG.get("result_cache_max_mb", 1024) * 1024 * 1024
+    now = time.time()
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry_path = os.path.join(cache_dir, name)
+        try:
+            last_used = os.path.getmtime(os.path.join(entry_path, "meta.json"))
+        except OSError:
+            continue # Entry being built
+        if now - last_used > max_age:
+            shutil.rmtree(entry_path, ignore_errors=True)
+        else:
+            entries.append((last_used, entry_path, _directory_size(entry_path)))
+    total = sum(size for _, _, size in entries)
+    for _, entry_path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_path, ignore_errors=True)
+        total -= size
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(OUTPUT_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _replace_file(src, dst):
+    # Through a temporary file, which also breaks hardlinks to the skeleton cache
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    temp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    _clone_file(src, temp_path)
+    shutil.copymode(src, temp_path)
+    os.replace(temp_path, dst)
+
+def snapshot_project(project_path, workspace_path, base_path, exclude=TREE_MANIFEST_EXCLUDES):
+    """
+    Copies a project into an agent workspace, sharing data blocks where the filesystem
+    supports reflinks, and returns the manifest of the copied files (the merge base).
+    The files are also copied to base_path, so the agent's changes can later be diffed
+    against what it started from. logs/ and memory/ are symlinked instead, so logs and
+    shared context stay in the project.
+    """
+    for path in (workspace_path, base_path):
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    base = {}
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        with os.scandir(os.path.join(project_path, relative_dir)) as entries:
+            for entry in entries:
+                if relative_dir == "" and entry.name in exclude:
+                    continue
+                relative_path = os.path.join(relative_dir, entry.name)
+                target = os.path.join(workspace_path, relative_path)
+                if entry.is_symlink():
+                    os.symlink(os.readlink(entry.path), target)
+                elif entry.is_dir():
+                    os.mkdir(target)
+                    os.mkdir(os.path.join(base_path, relative_path))
+                    pending.append(relative_path)
+                elif entry.is_file():
+                    _clone_file(entry.path, target)
+                    shutil.copymode(entry.path, target)
+                    _clone_file(target, os.path.join(base_path, relative_path))
+                    base[relative_path] = _file_digest(target)
+    for shared_dir in ("logs", "memory"):
+        os.makedirs(os.path.join(project_path, shared_dir), exist_ok=True)
+        os.symlink(os.path.join(project_path, shared_dir), os.path.join(workspace_path, shared_dir))
+    return base
+
+def _file_diff(relative_path, old_path, new_path):
+    contents = []
+    for path in (old_path, new_path):
+        if path is None:
+            contents.append([])
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            contents.append(data.decode().splitlines(keepends=True))
+        except UnicodeDecodeError:
+            return [f"Binary file {relative_path} differs\n"]
+    diff = difflib.unified_diff(contents[0], contents[1], f"a/{relative_path}" if old_path else "/dev/null",
+                                f"b/{relative_path}" if new_path else "/dev/null")
+    return [line if line.endswith("\n") else line + "\n" for line in diff]
+
+def merge_agent_workspace(agent_name, project_path, workspace_path, base, base_path):
+    """
+    Three-way merges the changes an agent made in its workspace back into the project.
+
+    A file the agent added, modified or deleted is applied when the project still has
+    the base version. If another agent changed it in the meantime, the project version
+    is kept and the agent's version is written next to it as <file>.conflict-<agent>.
+    The agent's changes, against its copy of the base in base_path, are written as a
+    unified diff to logs/. Returns a summary of the merge for the orchestration record.
+    """
+    theirs = _tree_manifest(workspace_path)
+    changes = {"added": [], "modified": [], "deleted": [], "conflicts": []}
+    diff_lines = []
+    for relative_path in sorted(set(base) | set(theirs)):
+        base_digest, agent_digest = base.get(relative_path), theirs.get(relative_path)
+        if base_digest == agent_digest:
+            continue # Not touched by the agent
+        project_file = os.path.join(project_path, relative_path)
+        agent_file = os.path.join(workspace_path, relative_path)
+        project_digest = _file_digest(project_file) if os.path.isfile(project_file) else None
+        if project_digest == agent_digest:
+            continue # Same change already in the project
+        # Against the base, so that a conflict does not show another agent's change as reverted
+        diff_lines += _file_diff(relative_path, os.path.join(base_path, relative_path) if base_digest else None,
+                                 agent_file if agent_digest else None)
+        if project_digest != base_digest:
+            changes["conflicts"].append(relative_path)
+            if agent_digest:
+                _replace_file(agent_file, f"{project_file}.conflict-{agent_name}")
+        elif agent_digest is None:
+            os.remove(project_file)
+            changes["deleted"].append(relative_path)
+        else:
+            _replace_file(agent_file, project_file)
+            changes["added" if base_digest is None else "modified"].append(relative_path)
+
+    if diff_lines:
+        diff_path = os.path.join(project_path, "logs", f"{agent_name}_{datetime.now().strftime('%Y%m%d-%H%M%S')}.diff")
+        with open(diff_path, "w") as f:
+            f.writelines(diff_lines)
+        changes["diff_file"] = diff_path
+        changes["lines_added"] = sum(1 for line in diff_lines if line.startswith("+") and not line.startswith("+++"))
+        changes["lines_removed"] = sum(1 for line in diff_lines if line.startswith("-") and not line.startswith("---"))
+    return changes
+
+class AgentWorkspace:
+    """
+    An agent's own snapshot of a project, under <project>/.workspaces/<agent>.
+
+    Snapshots and merges of one project share `lock`, so every snapshot is a
+    consistent view of the project and merges never interleave.
+    """
+
+    def __init__(self, agent_name, project_path, lock):
+        self.agent_name = agent_name
+        self.project_path = project_path
+        self.path = os.path.join(project_path, AGENT_WORKSPACES_DIR, agent_name)
+        self.base_path = os.path.join(project_path, AGENT_WORKSPACES_DIR, ".base", agent_name)
+        self.lock = lock
+        self.base = None
+
+    async def snapshot(self):
+        async with self.lock:
+            self.base = await run_bulk_io(snapshot_project, self.project_path, self.path, self.base_path)
+        return self.base
+
+    async def merge(self):
+        async with self.lock:
+            return await run_bulk_io(merge_agent_workspace, self.agent_name, self.project_path, self.path,
+                                     self.base, self.base_path)
+
+    def _remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        shutil.rmtree(self.base_path, ignore_errors=True)
+        # Only once no other agent workspace is left
+        for directory in (os.path.dirname(self.base_path), os.path.dirname(self.path)):
+            with contextlib.suppress(OSError):
+                os.rmdir(directory)
+
+    async def discard(self):
+        await run_bulk_io(self._remove)
+
+async def run_isolated_agent(scheduler, agent_name, task, project_path, merge_lock, details, **kwargs):
+    """
+    Runs an agent in its own snapshot of the project, under .workspaces/<agent>, and
+    merges its changes back once it succeeds. The snapshot is taken when the agent is
+    granted a slot; snapshots and merges of one project are serialized by `merge_lock`.
+    The workspace of a failed agent is kept, unmerged, for inspection.
+    """
+    workspace = AgentWorkspace(agent_name, project_path, merge_lock)
+    try:
+        result = await run_scheduled_agent(scheduler, agent_name, task, project_path, details=details,
+                                           workspace=workspace, **kwargs)
+    except asyncio.CancelledError:
+        await workspace.discard()
+        raise
+    if workspace.base is None:
+        return result # Restored from the result cache straight into the project
+    if result is not True:
+        details["workspace"] = workspace.path
+        logger.warning(f"Agent {agent_name} failed. Its workspace is kept unmerged at {workspace.path}")
+        return result
+
+    changes = await workspace.merge()
+    await workspace.discard()
+    details["workspace_changes"] = changes
+    logger.info(f"Merged workspace of {agent_name}: {len(changes['added'])} added, {len(changes['modified'])} modified, "
+                f"{len(changes['deleted'])} deleted, {len(changes['conflicts'])} conflicts")
+    if changes["conflicts"]:
+        logger.warning(f"Merge conflicts for {agent_name} (kept the project version, agent version in "
+                       f"<file>.conflict-{agent_name}): {', '.join(changes['conflicts'])}")
+    return result
+
+def resolve_agent_dependencies(agents, project_type, overrides=None):
+    """
+    Returns {agent: [agents it depends on]} for the requested agents.
+
+    agent_dependencies from config.json are overridden per agent by the project
+    template's agent_dependencies, then by `overrides`. Dependencies on agents that
+    were not requested are ignored. Raises ValueError if the graph has a cycle.
+    """
+    declared = dict(CONFIG.get("agent_dependencies", {}))
+    declared.update(CONFIG.get("project_templates", {}).get(project_type, {}).get("agent_dependencies", {}))
+    declared.update(overrides or {})
+    requested = set(agents)
+    dependencies = {agent: [dep for dep in declared.get(agent, []) if dep in requested] for agent in agents}
+
+    # Kahn's algorithm: whatever cannot be ordered is part of a cycle
+    remaining = {agent: set(deps) for agent, deps in dependencies.items()}
+    while remaining:
+        ready = [agent for agent, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between agents: {', '.join(sorted(remaining))}")
+        for agent in ready:
+            del remaining[agent]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return dependencies
+
+async def run_agent_graph(agents, dependencies, run_node, fail_fast=None):
+    """
+    Runs run_node(agent) for every agent as soon as all of its dependencies have
+    succeeded, so independent branches run in parallel. Agents downstream of a
+    failed (or not running) dependency are skipped.
+
+    With `fail_fast`, a callable telling whether an agent is required, the first
+    failure of a required agent cancels every other agent of the graph.
+
+    Returns {agent: outcome}; an outcome holds either "skipped" (the failed
+    dependencies), "aborted" (the required agent whose failure cancelled it) or
+    "result", with "start"/"end" offsets in seconds from the start if it ran.
+    """
+    graph_start = time.monotonic()
+    outcomes = {}
+    aborted_by = None
+
+    async def run(agent):
+        nonlocal aborted_by
+        start = None
+        try:
+            upstream = [tasks[dep] for dep in dependencies.get(agent, []) if dep in tasks]
+            if upstream:
+                await asyncio.wait(upstream)
+            failed = [dep for dep in dependencies.get(agent, []) if outcomes.get(dep, {}).get("result") is not True]
+            if failed:
+                logger.warning(f"Skipping agent {agent} because upstream agents failed: {', '.join(failed)}")
+                outcomes[agent] = {"skipped": failed}
+                return
+            start = time.monotonic() - graph_start
+            try:
+                result = await run_node(agent)
+            except Exception as e:
+                result = e
+        except asyncio.CancelledError:
+            if aborted_by is None:
+                raise # The whole graph is being cancelled
+            outcomes[agent] = {"aborted": aborted_by}
+            if start is not None:
+                outcomes[agent].update(start=start, end=time.monotonic() - graph_start)
+            return
+        outcomes[agent] = {"result": result, "start": start, "end": time.monotonic() - graph_start}
+
+        if result is not True and fail_fast and aborted_by is None and fail_fast(agent):
+            aborted_by = agent
+            logger.warning(f"Required agent {agent} failed. Cancelling the remaining agents (fail-fast).")
+            for other, task in tasks.items():
+                if other != agent and not task.done():
+                    task.cancel()
+
+    tasks = {agent: asyncio.ensure_future(run(agent)) for agent in agents}
+    try:
+        await asyncio.gather(*tasks.values())
+    except asyncio.CancelledError:
+        # gather raises on the first cancelled agent; let every agent finish its teardown first
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.wait(tasks.values())
+        raise
+    return outcomes
+
+def _critical_path(outcomes, dependencies):
+    """
+    Follows, from the last agent to finish, the dependency that finished last at each step.
+    Agents cancelled by fail-fast did not run to completion and are left out.
+    """
+    finished = {agent: outcome for agent, outcome in outcomes.items() if "result" in outcome}
+    if not finished:
+        return None
+    agent = max(finished, key=lambda name: finished[name]["end"])
+    path = [agent]
+    while True:
+        upstream = [dep for dep in dependencies.get(agent, []) if dep in finished]
+        if not upstream:
+            break
+        agent = max(upstream, key=lambda name: finished[name]["end"])
+        path.append(agent)
+    path.reverse()
+    return {"agents": path, "seconds": round(finished[path[-1]]["end"], 3)}
+
+def parse_agent_dependency(value):
+    """
+    Parses an AGENT:DEP[,DEP...] command line argument.
+    """
+    agent, separator, deps = value.partition(":")
+    if not separator or not agent:
+        raise argparse.ArgumentTypeError(f"expected AGENT:DEPENDENCY[,DEPENDENCY...], got '{value}'")
+    return agent, [dep for dep in deps.split(",") if dep]
+
+def resolve_project_path(workspace, task, project_path=None, suffix=""):
+    """
+    Returns the absolute project path for a task, generating one from the task and timestamp if needed.
+    """
+    if project_path:
+        return os.path.abspath(os.path.join(workspace, project_path))
+    # Generate a project path based on task and timestamp
+    task_slug = task.lower().replace(" ", "-").replace("/", "-")[:50]
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    project_name = f"orchestrated-project-{task_slug}-{timestamp}{suffix}"
+    return os.path.abspath(os.path.join(workspace, project_name))
+
+async def orchestrate_task(task, project_type, agents, memory_dir, scheduler, workspace=None,
+                           project_path=None, priority=0, project_name_suffix="", record_extra=None,
+                           use_cache=None, dependency_overrides=None, fail_fast=None, isolate=None,
+                           record_cancelled=True):
+    """
+    Scaffolds a project, runs the requested agents through the scheduler and saves
+    the orchestration record to the history store. Returns the record.
+    With record_cancelled=False a cancelled orchestration saves no record, for callers
+    that will run the same task again.
+    use_cache defaults to the result_cache_enabled setting; dependency_overrides
+    ({agent: [agents]}) take precedence over the configured agent dependencies.
+    fail_fast and isolate (per-agent workspaces) default to the fail_fast and
+    workspace_isolation settings.
+    """
+    orchestration_start = time.monotonic()
+    try:
+        orchestration_record = {
+            "timestamp_start": datetime.now().isoformat(),
+            "task": task,
+            "project_type": project_type,
+            "agents_requested": agents,
+            "project_path": None,
+            "priority": priority,
+            "status": "failed", # Default to failed, update to success if all goes well
+            "timestamp_end": None,
+            "agent_results": {}
+        }
+        orchestration_record.update(record_extra or {})
+
+        full_project_path = resolve_project_path(workspace or os.getcwd(), task, project_path, suffix=project_name_suffix)
+        orchestration_record["project_path"] = full_project_path
+
+        try:
+            dependencies = resolve_agent_dependencies(agents, project_type, dependency_overrides)
+        except ValueError as e:
+            orchestration_record["status"] = "failed_invalid_dependencies"
+            orchestration_record["error_details"] = str(e)
+            orchestration_record["timestamp_end"] = datetime.now().isoformat()
+            logger.error(f"Invalid agent dependencies for task '{task}': {e}")
+            await run_io(save_orchestration_record, memory_dir, orchestration_record)
+            return orchestration_record
+        orchestration_record["agent_dependencies"] = {agent: deps for agent, deps in dependencies.items() if deps}
+
+        logger.info(f"Starting Crypto AI Orchestration for task: '{task}'")
+        logger.info(f"Project will be created at: {full_project_path}")
+
+        # Create project structure
+        scaffold_start = time.monotonic()
+        if not await run_bulk_io(create_project_structure, full_project_path, project_type):
+            orchestration_record["status"] = "failed_structure_creation"
+            logger.error(f"Project structure creation failed for {full_project_path}. Aborting orchestration.")
+            return orchestration_record
+        orchestration_record["scaffold_seconds"] = round(time.monotonic() - scaffold_start, 4)
+
+        # Prepare agent tasks for asynchronous execution through the bounded scheduler
+        if use_cache is None:
+            use_cache = CONFIG.get("result_cache_enabled", False)
+        agent_details = {}
+        agents_to_run = []
+        for agent in agents:
+            if check_agent_availability(agent):
+                agent_details[agent] = {}
+                agents_to_run.append(agent)
+            else:
+                logger.warning(f"Skipping agent {agent} due to unavailability.")
+                orchestration_record["agent_results"][agent] = {"status": "skipped", "reason": "not available"}
+
+        # Isolation: external agents work on their own snapshot of the project, merged back when they succeed
+        if isolate is None:
+            isolate = CONFIG.get("workspace_isolation", False)
+        merge_lock = asyncio.Lock()
+
+        async def run_node(agent):
+            if isolate and "argv" in (get_agent_spec(agent) or {}):
+                return await run_isolated_agent(scheduler, agent, task, full_project_path, merge_lock,
+                                                details=agent_details[agent], priority=priority,
+                                                project_type=project_type, use_cache=use_cache)
+            return await run_scheduled_agent(scheduler, agent, task, full_project_path, priority=priority,
+                                             details=agent_details[agent], project_type=project_type,
+                                             use_cache=use_cache)
+
+        # Fail-fast: a failed agent cancels the others unless its registry entry sets "required": false
+        if fail_fast is None:
+            fail_fast = CONFIG.get("fail_fast", False)
+        is_required = (lambda agent: agent_setting(get_agent_spec(agent), "required", True)) if fail_fast else None
+
+        # Run each agent as soon as its dependencies succeed, at most max_concurrent_tasks at a time
+        if agents_to_run:
+            outcomes = await run_agent_graph(agents_to_run, dependencies, run_node, fail_fast=is_required)
+            for agent in agents_to_run:
+                outcome = outcomes[agent]
+                if "skipped" in outcome:
+                    orchestration_record["agent_results"][agent] = {
+                        "status": "skipped", "reason": f"upstream failed: {', '.join(outcome['skipped'])}"}
+                    continue
+                if "aborted" in outcome:
+                    orchestration_record["aborted_by"] = outcome["aborted"]
+                    orchestration_record["agent_results"][agent] = {
+                        "status": "cancelled", "reason": f"fail-fast: {outcome['aborted']} failed"}
+                    if "start" not in outcome:
+                        continue
+                elif isinstance(outcome["result"], Exception):
+                    orchestration_record["agent_results"][agent] = {"status": "error", "details": str(outcome["result"])}
+                else:
+                    orchestration_record["agent_results"][agent] = {"status": "success" if outcome["result"] else "failed"}
+                orchestration_record["agent_results"][agent].update(agent_details[agent])
+                orchestration_record["agent_results"][agent]["start_offset_seconds"] = round(outcome["start"], 3)
+                orchestration_record["agent_results"][agent]["end_offset_seconds"] = round(outcome["end"], 3)
+            orchestration_record["critical_path"] = _critical_path(outcomes, dependencies)
+
+        # Determine overall status
+        all_agents_succeeded = all(res.get("status") == "success" for res in orchestration_record["agent_results"].values())
+        if all_agents_succeeded and agents_to_run:
+            orchestration_record["status"] = "success"
+        elif not agents_to_run:
+            orchestration_record["status"] = "no_agents_run"
+
+        orchestration_record["timestamp_end"] = datetime.now().isoformat()
+        orchestration_record["duration_seconds"] = round(time.monotonic() - orchestration_start, 3)
+
+        # Save orchestration record to the history store
+        await run_io(save_orchestration_record, memory_dir, orchestration_record)
+        if CONFIG.get("metrics_textfile"):
+            await run_io(export_metrics_textfile, memory_dir, CONFIG["metrics_textfile"])
+
+        logger.info(f"Orchestration complete for task: '{task}'")
+        logger.info(f"Check the generated project at: {full_project_path}")
+        return orchestration_record
+
+    except asyncio.CancelledError:
+        logger.warning(f"Orchestration cancelled for task: '{task}'")
+        if record_cancelled and 'orchestration_record' in locals():
+            orchestration_record["status"] = "cancelled"
+            orchestration_record["timestamp_end"] = datetime.now().isoformat()
+            await run_io(save_orchestration_record, memory_dir, orchestration_record)
+        raise
+
+    except Exception as e:
+        logger.critical(f"An unhandled critical error occurred during orchestration: {e}", exc_info=True)
+        # Attempt to save a minimal record of the critical failure
+        if 'orchestration_record' in locals():
+            orchestration_record["status"] = "critical_failure"
+            orchestration_record["timestamp_end"] = datetime.now().isoformat()
+            orchestration_record["error_details"] = str(e)
+            await run_io(save_orchestration_record, memory_dir, orchestration_record)
+            return orchestration_record
+        logger.error("Could not save orchestration record for critical failure as record object was not initialized.")
+        return {"task": task, "status": "critical_failure", "error_details": str(e)}
+
+def validate_task_request(request):
+    """
+    Checks the fields of a task coming from a manifest, a daemon request or a queue job.
+    Returns an error message, or None if the task is valid. Optional fields may be null.
+    """
+    if not isinstance(request, dict):
+        return "must be a JSON object"
+    if not isinstance(request.get("task"), str) or not request["task"].strip():
+        return "'task' is required and must be a string"
+    for key in ("project_type", "project_path", "workspace"):
+        if request.get(key) is not None and not isinstance(request[key], str):
+            return f"'{key}' must be a string"
+    priority = request.get("priority")
+    if priority is not None and (isinstance(priority, bool) or not isinstance(priority, int)):
+        return "'priority' must be an integer"
+    agents = request.get("agents")
+    if agents is not None and (not isinstance(agents, list) or not all(isinstance(agent, str) for agent in agents)):
+        return "'agents' must be a list of agent names"
+    depends = request.get("depends")
+    if depends is not None and (not isinstance(depends, dict) or not all(
+            isinstance(deps, list) and all(isinstance(dep, str) for dep in deps) for deps in depends.values())):
+        return "'depends' must map agent names to lists of agent names"
+    for key in ("fail_fast", "isolate", "no_cache"):
+        if request.get(key) is not None and not isinstance(request[key], bool):
+            return f"'{key}' must be true, false or null"
+    return None
+
+def load_task_manifest(manifest_path):
+    """
+    Loads a batch manifest: either a JSON list of task objects or one JSON object per line.
+    Each task needs a "task" and may set "project_type", "agents", "project_path", "priority",
+    "depends" ({agent: [agents it depends on]}), "fail_fast" and "isolate".
+    """
+    with open(manifest_path, 'r') as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for index, entry in enumerate(entries):
+        error = validate_task_request(entry)
+        if error:
+            raise ValueError(f"Manifest entry {index}: {error}")
+    return entries
+
+def _batch_entry_key(index, entry):
+    # Ties progress to both the position and the content of a manifest entry
+    digest = hashlib.sha1(json.dumps(entry, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{index}:{digest}"
+
+def _load_batch_progress(progress_path):
+    progress = {}
+    try:
+        with open(progress_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # A line cut short by a crash
+                progress[entry["key"]] = entry
+    except FileNotFoundError:
+        pass
+    return progress
+
+def _entry_option(entry, key, default):
+    # A null option in a manifest entry means "not set", like a missing one
+    return entry[key] if entry.get(key) is not None else default
+
+async def orchestrate_batch(manifest_path, memory_dir, workspace=None, max_parallel_tasks=None,
+                            resume=False, retry_failed=False, use_cache=None, fail_fast=None, isolate=None):
+    """
+    Runs every task of a manifest in this process with a shared config and scheduler.
+
+    Completed tasks are appended to <manifest>.progress as they finish, so a
+    batch interrupted by a crash can be resumed with resume=True.
+    """
+    try:
+        entries = load_task_manifest(manifest_path)
+    except (IOError, ValueError) as e:
+        logger.error(f"Error loading task manifest {manifest_path}: {e}")
+        return False
+
+    progress_path = f"{manifest_path}.progress"
+    progress = _load_batch_progress(progress_path) if resume else {}
+    pending = []
+    for index, entry in enumerate(entries):
+        done = progress.get(_batch_entry_key(index, entry))
+        if done and not (retry_failed and done.get("status") != "success"):
+            continue
+        pending.append((index, entry))
+    logger.info(f"Batch {manifest_path}: {len(entries)} tasks, {len(entries) - len(pending)} already completed, "
+                f"{len(pending)} to run.")
+
+    scheduler = build_scheduler()
+    max_parallel_tasks = max_parallel_tasks or CONFIG.get("max_concurrent_tasks", 5)
+    task_slots = asyncio.Semaphore(max_parallel_tasks)
+    default_agents = CONFIG.get("default_agents", ["smol-developer", "aider", "shell-gpt"])
+    statuses = collections.Counter()
+
+    progress_lock = threading.Lock()
+
+    def _append_batch_progress(progress_file, line):
+        with progress_lock:
+            progress_file.write(line)
+            progress_file.flush()
+            os.fsync(progress_file.fileno())
+
+    with open(progress_path, "a" if resume else "w") as progress_file:
+        async def run_entry(index, entry):
+            async with task_slots:
+                record = await orchestrate_task(
+                    entry["task"], entry.get("project_type") or "revolution", entry.get("agents") or default_agents,
+                    memory_dir, scheduler, workspace=workspace, project_path=entry.get("project_path"),
+                    priority=entry.get("priority") or 0, project_name_suffix=f"-{index:04d}",
+                    record_extra={"batch": {"manifest": os.path.abspath(manifest_path), "index": index}},
+                    use_cache=use_cache, dependency_overrides=entry.get("depends"),
+                    fail_fast=_entry_option(entry, "fail_fast", fail_fast), isolate=_entry_option(entry, "isolate", isolate),
+                )
+            statuses[record["status"]] += 1
+            line = json.dumps({"key": _batch_entry_key(index, entry), "status": record["status"],
+                               "project_path": record.get("project_path")}) + "\n"
+            await run_io(_append_batch_progress, progress_file, line)
+
+        await asyncio.gather(*(run_entry(index, entry) for index, entry in pending))
+
+    logger.info(f"Batch {manifest_path} finished: {dict(statuses)}")
+    return True
+
+class OrchestratorDaemon:
+    """
+    Resident orchestrator serving submit/status/cancel/history/reload requests on a Unix socket.
+
+    The protocol is one JSON object per line in each direction, e.g.
+    {"op": "submit", "task": "...", "project_type": "defi"} -> {"ok": true, "job_id": "..."}.
+    Submissions return as soon as the job is registered; the job then runs in the
+    background with the same scheduler as every other job of this process.
+    """
+
+    def __init__(self, socket_path, memory_dir, workspace=None, max_parallel_tasks=None):
+        self.socket_path = socket_path
+        self.memory_dir = memory_dir
+        self.workspace = workspace or os.getcwd()
+        self.scheduler = build_scheduler()
+        self.max_parallel_tasks = max_parallel_tasks
+        self.task_slots = asyncio.Semaphore(max_parallel_tasks or CONFIG.get("max_concurrent_tasks", 5))
+        self.jobs = {}
+        self._tasks = {}
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                logger.error(f"{self.socket_path} exists and is not a socket. Refusing to replace it.")
+                return
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+                writer.close()
+                logger.error(f"Another orchestrator daemon is already listening on {self.socket_path}")
+                return
+            except OSError:
+                os.remove(self.socket_path) # Left behind by a daemon that did not shut down cleanly
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        logger.info(f"Orchestrator daemon listening on {self.socket_path}")
+        try:
+            await stop.wait()
+        finally:
+            logger.info("Shutting down orchestrator daemon.")
+            server.close()
+            await server.wait_closed()
+            for job_task in list(self._tasks.values()):
+                job_task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.socket_path)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    response = await self.handle_request(request)
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                    response = {"ok": False, "error": f"Invalid request: {e}"}
+                except Exception as e:
+                    # A failing op (e.g. a history store error) must not drop the connection
+                    logger.error(f"Daemon request failed: {e}")
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Invalid request: must be a JSON object"}
+        op = request.get("op")
+        if op == "submit":
+            return self.submit(request)
+        if op == "status":
+            if request.get("job_id"):
+                job = self.jobs.get(request["job_id"])
+                return {"ok": True, "job": job} if job else {"ok": False, "error": "Unknown job id"}
+            return {"ok": True, "jobs": list(self.jobs.values())}
+        if op == "cancel":
+            job_task = self._tasks.get(request["job_id"])
+            if job_task is None:
+                return {"ok": False, "error": "Unknown or finished job id"}
+            job_task.cancel()
+            return {"ok": True, "job_id": request["job_id"]}
+        if op == "history":
+            for key in ("limit", "offset"):
+                value = request.get(key)
+                if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                    return {"ok": False, "error": f"'{key}' must be a non-negative integer"}
+            filters = {key: request.get(key) for key in ("status", "agent", "project_type", "since", "until")}
+            total, records = await run_io(self._query_history, request.get("limit", 20), request.get("offset", 0), filters)
+            return {"ok": True, "total": total, "records": records}
+        if op == "reload":
+            await run_io(load_config, request.get("config_path", CONFIG_PATH))
+            reloaded = build_scheduler()
+            self.scheduler.max_workers = reloaded.max_workers
+            self.scheduler.per_agent_limits = reloaded.per_agent_limits
+            self.scheduler.agent_priorities = reloaded.agent_priorities
+            if not self.max_parallel_tasks:
+                # Jobs already waiting keep the old limit; jobs submitted from now on use the new one
+                self.task_slots = asyncio.Semaphore(CONFIG.get("max_concurrent_tasks", 5))
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+    def _query_history(self, limit, offset, filters):
+        store = HistoryStore(self.memory_dir)
+        try:
+            return store.count(**filters), store.query(limit=limit, offset=offset, **filters)
+        finally:
+            store.close()
+
+    def submit(self, request):
+        error = validate_task_request(request)
+        if error:
+            return {"ok": False, "error": f"Invalid request: {error}"}
+        job_id = uuid.uuid4().hex[:12]
+        self.jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "task": request["task"],
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "project_path": None,
+        }
+        self._tasks[job_id] = asyncio.ensure_future(self._run_job(job_id, request))
+        self._prune_jobs()
+        return {"ok": True, "job_id": job_id}
+
+    async def _run_job(self, job_id, request):
+        job = self.jobs[job_id]
+        try:
+            async with self.task_slots:
+                job["status"] = "running"
+                record = await orchestrate_task(
+                    request["task"], request.get("project_type") or "revolution",
+                    request.get("agents") or CONFIG.get("default_agents", ["smol-developer", "aider", "shell-gpt"]),
+                    self.memory_dir, self.scheduler, workspace=request.get("workspace") or self.workspace,
+                    project_path=request.get("project_path"), priority=request.get("priority") or 0,
+                    project_name_suffix=f"-{job_id}", record_extra={"job_id": job_id},
+                    use_cache=False if request.get("no_cache") else None,
+                    dependency_overrides=request.get("depends"), fail_fast=request.get("fail_fast"),
+                    isolate=request.get("isolate"),
+                )
+            job["status"] = record["status"]
+            job["project_path"] = record.get("project_path")
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+            self._tasks.pop(job_id, None)
+
+    def _prune_jobs(self):
+        # Forget the oldest finished jobs; their records remain in the history store
+        finished = [job_id for job_id in self.jobs if job_id not in self._tasks]
+        for job_id in finished[:max(0, len(self.jobs) - DAEMON_MAX_TRACKED_JOBS)]:
+            del self.jobs[job_id]
+
+def send_daemon_request(socket_path, request):
+    """
+    Sends a single request to a running daemon and returns its response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as response_file:
+            return json.loads(response_file.readline())
+
+def _write_json_atomic(path, data):
+    # Written under a temporary name first, so readers never see a partial file
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+class JobQueue:
+    """
+    Durable orchestration job queue kept as JSON files in a spool directory:
+
+        pending/  jobs waiting for a worker, claimed oldest first
+        leased/   jobs being run, one <job>@<worker>.json file per lease
+        done/     finished jobs, with the status of their orchestration
+        failed/   jobs given up after queue_max_attempts lost leases
+
+    Every state change is a rename within the directory, which is atomic, so worker
+    processes on one host or on several hosts sharing the directory can claim jobs
+    without locks. Workers renew their leases by touching the lease files; a lease
+    not renewed for lease_timeout_seconds belongs to a dead worker and is requeued.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        for state in QUEUE_STATES:
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.queue_dir, state, name)
+
+    def _names(self, state):
+        return sorted(name for name in os.listdir(os.path.join(self.queue_dir, state)) if name.endswith(".json"))
+
+    def enqueue(self, job):
+        """
+        Adds a job (the arguments of an orchestration) to pending/ and returns its id.
+        """
+        job = {**job, "job_id": job.get("job_id") or uuid.uuid4().hex[:12],
+               "enqueued_at": datetime.now().isoformat(), "attempts": 0}
+        _write_json_atomic(self._path("pending", f"{time.time_ns():020d}-{job['job_id']}.json"), job)
+        return job["job_id"]
+
+    def claim(self, worker_id):
+        """
+        Leases the oldest pending job to `worker_id`. Returns (lease_name, job), or None if there is none.
+        """
+        for name in self._names("pending"):
+            lease_name = f"{name[:-len('.json')]}@{worker_id}.json"
+            lease_path = self._path("leased", lease_name)
+            try:
+                os.rename(self._path("pending", name), lease_path)
+                # A rename keeps the enqueue time as mtime: renew before a reaper takes it as stale
+                os.utime(lease_path)
+                with open(lease_path) as f:
+                    return lease_name, json.load(f)
+            except FileNotFoundError:
+                continue # Claimed (or reaped) by another worker first
+            except json.JSONDecodeError as e:
+                logger.error(f"Discarding unreadable queue job {name}: {e}")
+                os.replace(lease_path, self._path("failed", name))
+        return None
+
+    def heartbeat(self, lease_name):
+        """
+        Renews a lease. Returns False if the lease was lost, i.e. requeued as stale.
+        """
+        try:
+            os.utime(self._path("leased", lease_name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, lease_name, job, result):
+        _write_json_atomic(self._path("done", f"{job['job_id']}.json"), {**job, **result})
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path("leased", lease_name))
+
+    def release(self, lease_name):
+        """
+        Returns a leased job to pending/ as it was (the worker is shutting down).
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.rename(self._path("leased", lease_name), self._path("pending", lease_name.rsplit("@", 1)[0] + ".json"))
+
+    def requeue_stale(self, lease_timeout, max_attempts):
+        """
+        Moves leases not renewed for `lease_timeout` seconds back to pending/, or to
+        failed/ once a job has lost `max_attempts` leases. Returns the number of leases handled.
+        """
+        handled = 0
+        leased_dir = os.path.join(self.queue_dir, "leased")
+        for entry in os.listdir(leased_dir):
+            # "<lease>.reap-<id>" files are leases whose reaper died halfway
+            lease_name = entry.split(".reap-")[0]
+            if not lease_name.endswith(".json") or entry.endswith(".tmp"):
+                continue
+            path = os.path.join(leased_dir, entry)
+            try:
+                if time.time() - os.stat(path).st_mtime < lease_timeout:
+                    continue
+                # Take the stale lease first, so that only one worker requeues it
+                reap_path = os.path.join(leased_dir, f"{lease_name}.reap-{uuid.uuid4().hex[:8]}")
+                os.rename(path, reap_path)
+            except FileNotFoundError:
+                continue
+            if time.time() - os.stat(reap_path).st_mtime < lease_timeout:
+                os.rename(reap_path, os.path.join(leased_dir, lease_name)) # Renewed just before we took it
+                continue
+            name, worker_id = lease_name[:-len(".json")].rsplit("@", 1)
+            try:
+                with open(reap_path) as f:
+                    job = json.load(f)
+            except json.JSONDecodeError as e:
+                logger.error(f"Discarding unreadable queue job {name}: {e}")
+                os.replace(reap_path, self._path("failed", f"{name}.json"))
+                continue
+            job["attempts"] = job.get("attempts", 0) + 1
+            job["last_lost_worker"] = worker_id
+            if job["attempts"] >= max_attempts:
+                logger.error(f"Queue job {job['job_id']} lost {job['attempts']} leases (last on {worker_id}). Moved to failed/.")
+                _write_json_atomic(self._path("failed", f"{job['job_id']}.json"), job)
+            else:
+                logger.warning(f"Lease of queue job {job['job_id']} on {worker_id} expired. Requeued.")
+                _write_json_atomic(self._path("pending", f"{name}.json"), job)
+            os.remove(reap_path)
+            handled += 1
+        return handled
+
+    def is_drained(self):
+        """
+        True when no job is pending or leased, by any worker.
+        """
+        return not self._names("pending") and not self._names("leased")
+
+    def status(self):
+        """
+        Returns the number of jobs in each state and the current leases with their age in seconds.
+        """
+        counts = {state: len(self._names(state)) for state in QUEUE_STATES}
+        leases = []
+        for lease_name in self._names("leased"):
+            with contextlib.suppress(FileNotFoundError):
+                age = time.time() - os.stat(self._path("leased", lease_name)).st_mtime
+                leases.append({"lease": lease_name, "heartbeat_age_seconds": round(age, 1)})
+        return {"counts": counts, "leases": leases}
+
+def get_job_queue(memory_dir, queue_dir=None):
+    return JobQueue(queue_dir or CONFIG.get("queue_dir") or os.path.join(memory_dir, "queue"))
+
+class QueueWorker:
+    """
+    Worker process running orchestration jobs from a JobQueue.
+
+    Up to `max_parallel_tasks` jobs run at once through one shared scheduler, and
+    their records go to the history store like any other orchestration. On
+    SIGINT/SIGTERM the worker stops claiming, cancels its running jobs and returns
+    them to pending/ so that another worker picks them up.
+    """
+
+    def __init__(self, job_queue, memory_dir, workspace=None, max_parallel_tasks=None, worker_id=None):
+        self.queue = job_queue
+        self.memory_dir = memory_dir
+        self.workspace = workspace or os.getcwd()
+        self.max_parallel_tasks = max_parallel_tasks or CONFIG.get("max_concurrent_tasks", 5)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.scheduler = build_scheduler()
+        self._running = {}
+        self._lost_leases = set()
+        self._changed = None
+
+    async def run(self, exit_when_idle=False):
+        loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        stop = asyncio.Event()
+
+        def request_stop():
+            stop.set()
+            self._changed.set()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, request_stop)
+        lease_timeout = CONFIG.get("lease_timeout_seconds", 60)
+        max_attempts = CONFIG.get("queue_max_attempts", 3)
+        poll_seconds = CONFIG.get("queue_poll_seconds", 1)
+        heartbeat = asyncio.ensure_future(self._heartbeat(CONFIG.get("lease_heartbeat_seconds", 10)))
+        logger.info(f"Worker {self.worker_id} pulling jobs from {self.queue.queue_dir}")
+        try:
+            while not stop.is_set():
+                self._changed.clear()
+                await run_io(self.queue.requeue_stale, lease_timeout, max_attempts)
+                claimed = None
+                while len(self._running) < self.max_parallel_tasks:
+                    claimed = await run_io(self.queue.claim, self.worker_id)
+                    if claimed is None:
+                        break
+                    lease_name, job = claimed
+                    logger.info(f"Worker {self.worker_id} leased queue job {job['job_id']}: '{job['task']}'")
+                    self._running[lease_name] = asyncio.ensure_future(self._run_job(lease_name, job))
+                if exit_when_idle and claimed is None and not self._running and await run_io(self.queue.is_drained):
+                    break
+                # Poll again after poll_seconds, or as soon as a job finishes
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._changed.wait(), timeout=poll_seconds)
+        finally:
+            if self._running:
+                logger.info(f"Worker {self.worker_id} stopping. Returning {len(self._running)} running jobs to the queue.")
+            for job_task in list(self._running.values()):
+                job_task.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+            heartbeat.cancel()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+
+    async def _heartbeat(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            for lease_name, job_task in list(self._running.items()):
+                if not await run_io(self.queue.heartbeat, lease_name):
+                    # Another worker took it over: running it twice would only waste agents
+                    logger.warning(f"Worker {self.worker_id} lost lease {lease_name}. Cancelling its job.")
+                    self._lost_leases.add(lease_name)
+                    job_task.cancel()
+
+    async def _run_job(self, lease_name, job):
+        try:
+            record = await orchestrate_task(
+                job["task"], job.get("project_type") or "revolution",
+                job.get("agents") or CONFIG.get("default_agents", ["smol-developer", "aider", "shell-gpt"]),
+                self.memory_dir, self.scheduler, workspace=job.get("workspace") or self.workspace,
+                project_path=job.get("project_path"), priority=job.get("priority") or 0,
+                project_name_suffix=f"-{job['job_id']}",
+                record_extra={"queue_job_id": job["job_id"], "worker": self.worker_id},
+                use_cache=False if job.get("no_cache") else None,
+                dependency_overrides=job.get("depends"), fail_fast=job.get("fail_fast"), isolate=job.get("isolate"),
+                # A cancelled job goes back to the queue (released, or leased by another worker) and runs again
+                record_cancelled=False,
+            )
+            await run_io(self.queue.complete, lease_name, job, {
+                "status": record["status"], "project_path": record.get("project_path"),
+                "worker": self.worker_id, "finished_at": datetime.now().isoformat(),
+            })
+            logger.info(f"Queue job {job['job_id']} finished with status {record['status']}")
+        except asyncio.CancelledError:
+            if lease_name not in self._lost_leases:
+                await run_io(self.queue.release, lease_name)
+        finally:
+            self._lost_leases.discard(lease_name)
+            self._running.pop(lease_name, None)
+            self._changed.set()
+
+async def run_worker_pool(processes, worker_args):
+    """
+    Runs `processes` single-process workers as child processes and waits for them.
+    SIGINT/SIGTERM are forwarded, so every worker returns its running jobs to the queue.
+    """
+    argv = [sys.executable, os.path.abspath(__file__), "--config", CONFIG_PATH, "worker", "--processes", "1", *worker_args]
+    children = [await asyncio.create_subprocess_exec(*argv) for _ in range(processes)]
+    logger.info(f"Started {processes} worker processes: {', '.join(str(child.pid) for child in children)}")
+    loop = asyncio.get_running_loop()
+
+    def forward(signum):
+        for child in children:
+            if child.returncode is None:
+                child.send_signal(signum)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, forward, signum)
+    try:
+        for child in children:
+            await child.wait()
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signum)
+
 async def main():
+    global CONFIG_PATH
+    # --config is parsed first because the defaults of other options come from the configuration
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument("--config", default=CONFIG_PATH, help="Configuration file. Defaults to config.json.")
+    CONFIG_PATH = config_parser.parse_known_args()[0].config
     load_config()
 
     # Ensure memory directory exists
@@ -251,7 +2417,12 @@ async def main():
         logger.error(f"Error creating memory directory {memory_dir}: {e}")
         return # Exit if memory directory cannot be created
 
-    parser = argparse.ArgumentParser(description="Crypto AI Orchestrator - A multi-agent AI development system.")
+    default_socket = CONFIG.get("daemon_socket") or os.path.join(memory_dir, "orchestrator.sock")
+
+    parser = argparse.ArgumentParser(description="Crypto AI Orchestrator - A multi-agent AI development system.",
+                                     parents=[config_parser])
+    parser.add_argument("--debug-loop-stalls", type=float, metavar="MS",
+                        help="Log every event-loop stall longer than MS milliseconds. Defaults to loop_stall_threshold_ms.")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # Orchestrate command
@@ -264,154 +2435,575 @@ async def main():
                                     help="Base directory for the project workspace. Defaults to current working directory.")
     orchestrate_parser.add_argument("--project-path",
                                     help="Specific path for the new project. If not provided, a path will be generated.")
+    orchestrate_parser.add_argument("--tail", action="store_true",
+                                    help="Echo agent output to the console as it is produced.")
+    orchestrate_parser.add_argument("--priority", type=int, default=0,
+                                    help="Scheduling priority for this task's agents (higher runs first). Defaults to 0.")
+    orchestrate_parser.add_argument("--isolate", action="store_true",
+                                    help="Run each external agent in its own snapshot of the project and merge its changes back.")
+    orchestrate_parser.add_argument("--fail-fast", action="store_true",
+                                    help="Cancel the remaining agents as soon as a required agent fails.")
+    orchestrate_parser.add_argument("--no-cache", action="store_true",
+                                    help="Always run the agents, ignoring the result cache.")
+    orchestrate_parser.add_argument("--depends", action="append", type=parse_agent_dependency, default=[],
+                                    metavar="AGENT:DEP[,DEP]",
+                                    help="Run AGENT only after the listed agents succeed. Can be repeated.")
+
+    # Batch orchestration command
+    batch_parser = subparsers.add_parser("orchestrate-batch", help="Orchestrate every task of a JSON/JSONL manifest.")
+    batch_parser.add_argument("--manifest", required=True,
+                              help="JSON list or JSONL file of tasks (task, project_type, agents, project_path, priority).")
+    batch_parser.add_argument("--workspace", default=os.getcwd(),
+                              help="Base directory for the project workspaces. Defaults to current working directory.")
+    batch_parser.add_argument("--max-parallel-tasks", type=int,
+                              help="Maximum number of tasks orchestrated at once. Defaults to max_concurrent_tasks.")
+    batch_parser.add_argument("--resume", action="store_true",
+                              help="Skip tasks already completed according to <manifest>.progress.")
+    batch_parser.add_argument("--retry-failed", action="store_true",
+                              help="With --resume, also re-run completed tasks that did not succeed.")
+    batch_parser.add_argument("--tail", action="store_true",
+                              help="Echo agent output to the console as it is produced.")
+    batch_parser.add_argument("--isolate", action="store_true",
+                              help="Run each external agent in its own snapshot of the project and merge its changes back.")
+    batch_parser.add_argument("--fail-fast", action="store_true",
+                              help="Cancel the remaining agents as soon as a required agent fails.")
+    batch_parser.add_argument("--no-cache", action="store_true",
+                              help="Always run the agents, ignoring the result cache.")
+
+    # Daemon commands
+    serve_parser = subparsers.add_parser("serve", help="Run a resident orchestrator daemon on a Unix socket.")
+    serve_parser.add_argument("--socket", default=default_socket, help="Path of the Unix socket to listen on.")
+    serve_parser.add_argument("--workspace", default=os.getcwd(),
+                              help="Base directory for project workspaces. Defaults to current working directory.")
+    serve_parser.add_argument("--max-parallel-tasks", type=int,
+                              help="Maximum number of jobs orchestrated at once. Defaults to max_concurrent_tasks.")
+    client_parser = subparsers.add_parser("client", help="Send a request to a running orchestrator daemon.")
+    client_parser.add_argument("op", choices=["submit", "status", "cancel", "history", "reload"], help="Request to send.")
+    client_parser.add_argument("--socket", default=default_socket, help="Path of the daemon's Unix socket.")
+    client_parser.add_argument("--job-id", help="Job id for status/cancel.")
+    client_parser.add_argument("--task", help="The development task to submit.")
+    client_parser.add_argument("--project-type", help="Type of project for the submitted task.")
+    client_parser.add_argument("--agents", nargs="+", help="Agents for the submitted task.")
+    client_parser.add_argument("--project-path", help="Specific path for the submitted project.")
+    client_parser.add_argument("--priority", type=int, help="Scheduling priority for the submitted task.")
+    client_parser.add_argument("--fail-fast", action="store_const", const=True,
+                               help="Cancel the submitted task's remaining agents as soon as a required agent fails.")
+    client_parser.add_argument("--no-cache", action="store_const", const=True,
+                               help="Always run the submitted task's agents, ignoring the result cache.")
+    client_parser.add_argument("--depends", action="append", type=parse_agent_dependency, default=[],
+                               metavar="AGENT:DEP[,DEP]",
+                               help="Run AGENT only after the listed agents succeed. Can be repeated.")
+    client_parser.add_argument("--isolate", action="store_const", const=True,
+                               help="Run the submitted task's external agents in their own project snapshots.")
+    client_parser.add_argument("--limit", type=int, help="Maximum number of history records to return.")
+    client_parser.add_argument("--offset", type=int, help="Number of history records to skip.")
+
+    # Job queue commands
+    worker_parser = subparsers.add_parser("worker", help="Run orchestration jobs from the durable job queue.")
+    worker_parser.add_argument("--processes", type=int, default=1, help="Number of worker processes to run. Defaults to 1.")
+    worker_parser.add_argument("--queue-dir", help="Job queue directory. Defaults to queue_dir or memory/queue.")
+    worker_parser.add_argument("--workspace", default=os.getcwd(),
+                               help="Base directory for project workspaces. Defaults to current working directory.")
+    worker_parser.add_argument("--max-parallel-tasks", type=int,
+                               help="Maximum number of jobs run at once by each process. Defaults to max_concurrent_tasks.")
+    worker_parser.add_argument("--exit-when-idle", action="store_true",
+                               help="Exit once the queue has no pending or leased jobs left.")
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add orchestration jobs to the durable job queue.")
+    enqueue_source = enqueue_parser.add_mutually_exclusive_group(required=True)
+    enqueue_source.add_argument("--task", help="The development task to perform.")
+    enqueue_source.add_argument("--manifest", help="JSON list or JSONL file of tasks, as for orchestrate-batch.")
+    enqueue_parser.add_argument("--queue-dir", help="Job queue directory. Defaults to queue_dir or memory/queue.")
+    enqueue_parser.add_argument("--project-type", help="Type of project. Defaults to revolution.")
+    enqueue_parser.add_argument("--agents", nargs="+", help="Agents to use. Defaults to the worker's default_agents.")
+    enqueue_parser.add_argument("--project-path", help="Specific path for the new project.")
+    enqueue_parser.add_argument("--priority", type=int, help="Scheduling priority for this task's agents.")
+    enqueue_parser.add_argument("--depends", action="append", type=parse_agent_dependency, default=[],
+                                metavar="AGENT:DEP[,DEP]",
+                                help="Run AGENT only after the listed agents succeed. Can be repeated.")
+    enqueue_parser.add_argument("--isolate", action="store_const", const=True,
+                                help="Run each external agent in its own snapshot of the project and merge its changes back.")
+    enqueue_parser.add_argument("--no-cache", action="store_const", const=True,
+                                help="Always run the job's agents, ignoring the result cache.")
+    enqueue_parser.add_argument("--fail-fast", action="store_const", const=True,
+                                help="Cancel the remaining agents as soon as a required agent fails.")
+    queue_status_parser = subparsers.add_parser("queue-status", help="Show the jobs of the durable job queue by state.")
+    queue_status_parser.add_argument("--queue-dir", help="Job queue directory. Defaults to queue_dir or memory/queue.")
 
     # History command
     history_parser = subparsers.add_parser("history", help="Display orchestration history.")
+    history_parser.add_argument("--status", help="Only show records with this status (e.g. success, failed).")
+    history_parser.add_argument("--agent", help="Only show records that involved this agent.")
+    history_parser.add_argument("--project-type", help="Only show records of this project type.")
+    history_parser.add_argument("--since", help="Only show records started at or after this ISO date/time.")
+    history_parser.add_argument("--until", help="Only show records started before this ISO date/time.")
+    history_parser.add_argument("--limit", type=int, default=20, help="Maximum number of records to show. Defaults to 20.")
+    history_parser.add_argument("--offset", type=int, default=0, help="Number of records to skip. Defaults to 0.")
+
+    # Stats command
+    stats_parser = subparsers.add_parser("stats", help="Show p50/p95/p99 timings and resource usage per agent and project type.")
+    stats_parser.add_argument("--agent", help="Only use records that involved this agent.")
+    stats_parser.add_argument("--project-type", help="Only use records of this project type.")
+    stats_parser.add_argument("--since", help="Only use records started at or after this ISO date/time.")
+    stats_parser.add_argument("--until", help="Only use records started before this ISO date/time.")
+    stats_parser.add_argument("--limit", type=int, default=5000,
+                              help="Only use this many of the newest matching records. Defaults to 5000.")
+    stats_parser.add_argument("--prometheus-file", help="Also write the statistics to this Prometheus text file.")
+
+    # History maintenance commands
+    compact_parser = subparsers.add_parser("history-compact", help="Apply retention to the orchestration history.")
+    compact_parser.add_argument("--keep-days", type=int, default=CONFIG.get("history_retention_days"),
+                                help="Delete records older than this many days.")
+    compact_parser.add_argument("--max-records", type=int, default=CONFIG.get("history_max_records"),
+                                help="Keep only this many of the newest records.")
+    import_parser = subparsers.add_parser("history-import",
+                                          help="Import legacy orchestration_record_*.json files into the history store.")
+    import_parser.add_argument("--remove-files", action="store_true",
+                               help="Delete each legacy file once it has been imported.")
 
     args = parser.parse_args()
 
+    # Debug mode: report event-loop stalls, proving that agent I/O does not block the loop
+    stall_threshold_ms = args.debug_loop_stalls or CONFIG.get("loop_stall_threshold_ms")
+    monitor = LoopStallMonitor(stall_threshold_ms / 1000) if stall_threshold_ms else None
+
+    # SIGTERM stops running agents like Ctrl-C does, by cancelling the command ('serve' and 'worker' handle both)
+    if args.command not in ("serve", "worker"):
+        with contextlib.suppress(NotImplementedError): # No signal handlers on Windows event loops
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    if monitor:
+        monitor.start()
+    try:
+        await run_command(args, memory_dir)
+    finally:
+        if monitor:
+            await monitor.stop()
+
+async def run_command(args, memory_dir):
     if args.command == "history":
-        display_history(memory_dir)
+        display_history(memory_dir, status=args.status, agent=args.agent, project_type=args.project_type,
+                        since=args.since, until=args.until, limit=args.limit, offset=args.offset)
+        return
+
+    if args.command == "worker":
+        if args.processes > 1:
+            worker_args = ["--workspace", args.workspace]
+            for option, value in (("--queue-dir", args.queue_dir), ("--max-parallel-tasks", args.max_parallel_tasks)):
+                if value is not None:
+                    worker_args += [option, str(value)]
+            if args.exit_when_idle:
+                worker_args.append("--exit-when-idle")
+            await run_worker_pool(args.processes, worker_args)
+            return
+        worker = QueueWorker(get_job_queue(memory_dir, args.queue_dir), memory_dir, workspace=args.workspace,
+                             max_parallel_tasks=args.max_parallel_tasks)
+        await worker.run(exit_when_idle=args.exit_when_idle)
+        return
+
+    if args.command == "enqueue":
+        job_queue = get_job_queue(memory_dir, args.queue_dir)
+        if args.manifest:
+            try:
+                jobs = load_task_manifest(args.manifest)
+            except (IOError, ValueError) as e:
+                logger.error(f"Error loading task manifest {args.manifest}: {e}")
+                return
+        else:
+            jobs = [{"task": args.task, "project_type": args.project_type, "agents": args.agents,
+                     "project_path": args.project_path, "priority": args.priority,
+                     "depends": dict(args.depends) or None, "fail_fast": args.fail_fast, "isolate": args.isolate,
+                     "no_cache": args.no_cache}]
+        for job in jobs:
+            job_id = job_queue.enqueue(job)
+            print(job_id)
+        logger.info(f"Enqueued {len(jobs)} jobs in {job_queue.queue_dir}")
+        return
+
+    if args.command == "queue-status":
+        print(json.dumps(get_job_queue(memory_dir, args.queue_dir).status(), indent=2))
+        return
+
+    if args.command == "serve":
+        daemon = OrchestratorDaemon(args.socket, memory_dir, workspace=args.workspace,
+                                    max_parallel_tasks=args.max_parallel_tasks)
+        await daemon.serve()
+        return
+
+    if args.command == "client":
+        request = {"op": args.op}
+        for key in ("job_id", "task", "project_type", "agents", "project_path", "priority", "fail_fast", "isolate",
+                    "no_cache", "limit", "offset"):
+            if getattr(args, key) is not None:
+                request[key] = getattr(args, key)
+        if args.depends:
+            request["depends"] = dict(args.depends)
+        try:
+            print(json.dumps(send_daemon_request(args.socket, request), indent=2))
+        except OSError as e:
+            logger.error(f"Could not reach the orchestrator daemon at {args.socket}: {e}")
+        return
+
+    if args.command == "stats":
+        display_stats(memory_dir, agent=args.agent, project_type=args.project_type, since=args.since,
+                      until=args.until, limit=args.limit, prometheus_file=args.prometheus_file)
+        return
+
+    if args.command == "history-compact":
+        if args.keep_days is None and args.max_records is None:
+            logger.error("Nothing to compact: pass --keep-days and/or --max-records.")
+            return
+        store = HistoryStore(memory_dir)
+        try:
+            deleted = store.compact(keep_days=args.keep_days, max_records=args.max_records)
+        finally:
+            store.close()
+        logger.info(f"History compacted: {deleted} records deleted.")
+        return
+
+    if args.command == "history-import":
+        store = HistoryStore(memory_dir)
+        try:
+            imported = store.import_legacy_records(memory_dir, remove_files=args.remove_files)
+        finally:
+            store.close()
+        logger.info(f"Imported {imported} legacy orchestration records into {store.db_path}")
         return
     
     if args.command == "orchestrate":
-        try:
-            # Existing orchestration logic starts here
-            orchestration_record = {
-                "timestamp_start": datetime.now().isoformat(),
-                "task": args.task,
-                "project_type": args.project_type,
-                "agents_requested": args.agents,
-                "project_path": None,
-                "status": "failed", # Default to failed, update to success if all goes well
-                "timestamp_end": None,
-                "agent_results": {}
-            }
-
-            # Resolve project path
-            if args.project_path:
-                full_project_path = os.path.abspath(os.path.join(args.workspace, args.project_path))
-            else:
-                # Generate a project path based on task and timestamp
-                task_slug = args.task.lower().replace(" ", "-").replace("/", "-")[:50]
-                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-                project_name = f"orchestrated-project-{task_slug}-{timestamp}"
-                full_project_path = os.path.abspath(os.path.join(args.workspace, project_name))
+        if args.tail:
+            CONFIG["stream_agent_output"] = True
+        await orchestrate_task(args.task, args.project_type, args.agents, memory_dir, build_scheduler(),
+                               workspace=args.workspace, project_path=args.project_path, priority=args.priority,
+                               use_cache=False if args.no_cache else None,
+                               dependency_overrides=dict(args.depends) or None,
+                               fail_fast=True if args.fail_fast else None, isolate=True if args.isolate else None)
+        return
 
-            orchestration_record["project_path"] = full_project_path
+    if args.command == "orchestrate-batch":
+        if args.tail:
+            CONFIG["stream_agent_output"] = True
+        await orchestrate_batch(args.manifest, memory_dir, workspace=args.workspace,
+                                max_parallel_tasks=args.max_parallel_tasks, resume=args.resume,
+                                retry_failed=args.retry_failed, use_cache=False if args.no_cache else None,
+                                fail_fast=True if args.fail_fast else None, isolate=True if args.isolate else None)
 
-            logger.info(f"Starting Crypto AI Orchestration for task: '{args.task}'")
-            logger.info(f"Project will be created at: {full_project_path}")
+class HistoryStore:
+    """
+    Indexed store of orchestration records, kept in memory/history.db.
 
-            # Create project structure
-            if not create_project_structure(full_project_path, args.project_type):
-                orchestration_record["status"] = "failed_structure_creation"
-                logger.error(f"Project structure creation failed for {full_project_path}. Aborting orchestration.")
-                return
+    Each record is stored whole as JSON next to the columns used for filtering,
+    so `history` can filter and paginate without reading every record.
+    """
 
-            # Prepare agent tasks for asynchronous execution
-            agent_tasks = []
-            agents_to_run = []
-            for agent in args.agents:
-                if check_agent_availability(agent):
-                    agent_tasks.append(run_agent(agent, args.task, full_project_path))
-                    agents_to_run.append(agent)
-                else:
-                    logger.warning(f"Skipping agent {agent} due to unavailability.")
-                    orchestration_record["agent_results"][agent] = {"status": "skipped", "reason": "not available"}
-
-            # Run agents concurrently
-            if agent_tasks:
-                results = await asyncio.gather(*agent_tasks, return_exceptions=True)
-                for i, agent in enumerate(agents_to_run):
-                    if isinstance(results[i], Exception):
-                        orchestration_record["agent_results"][agent] = {"status": "error", "details": str(results[i])}
-                    else:
-                        orchestration_record["agent_results"][agent] = {"status": "success" if results[i] else "failed"}
-
-            # Determine overall status
-            all_agents_succeeded = all(res.get("status") == "success" for res in orchestration_record["agent_results"].values())
-            if all_agents_succeeded and agents_to_run:
-                orchestration_record["status"] = "success"
-            elif not agents_to_run:
-                orchestration_record["status"] = "no_agents_run"
+    def __init__(self, memory_dir):
+        self.db_path = os.path.join(memory_dir, HISTORY_DB_NAME)
+        self._conn = sqlite3.connect(self.db_path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT UNIQUE,
+                    timestamp_start TEXT,
+                    timestamp_end TEXT,
+                    task TEXT,
+                    project_type TEXT,
+                    status TEXT,
+                    record TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS record_agents (
+                    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+                    agent TEXT NOT NULL,
+                    status TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_records_start ON records(timestamp_start);
+                CREATE INDEX IF NOT EXISTS idx_records_status ON records(status, timestamp_start);
+                CREATE INDEX IF NOT EXISTS idx_records_project_type ON records(project_type, timestamp_start);
+                CREATE INDEX IF NOT EXISTS idx_record_agents_agent ON record_agents(agent, record_id);
+            """)
 
-            orchestration_record["timestamp_end"] = datetime.now().isoformat()
+    def close(self):
+        self._conn.close()
+
+    def add(self, record, source=None):
+        """
+        Inserts a record and returns its id. Records with an already known source are ignored.
+        """
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO records (source, timestamp_start, timestamp_end, task, project_type, status, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, record.get("timestamp_start"), record.get("timestamp_end"), record.get("task"),
+                 record.get("project_type"), record.get("status"), json.dumps(record)),
+            )
+            if not cursor.rowcount:
+                return None
+            record_id = cursor.lastrowid
+            agent_results = record.get("agent_results", {})
+            agents = dict.fromkeys(list(record.get("agents_requested") or []) + list(agent_results))
+            self._conn.executemany(
+                "INSERT INTO record_agents (record_id, agent, status) VALUES (?, ?, ?)",
+                [(record_id, agent, agent_results.get(agent, {}).get("status")) for agent in agents],
+            )
+        return record_id
+
+    def _where(self, status=None, agent=None, project_type=None, since=None, until=None):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if project_type:
+            clauses.append("project_type = ?")
+            params.append(project_type)
+        if since:
+            clauses.append("timestamp_start >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp_start < ?")
+            params.append(until)
+        if agent:
+            clauses.append("id IN (SELECT record_id FROM record_agents WHERE agent = ?)")
+            params.append(agent)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._conn.execute(f"SELECT COUNT(*) FROM records{where}", params).fetchone()[0]
 
-            # Save orchestration record to memory
-            record_filename = f"orchestration_record_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
-            record_filepath = os.path.join(memory_dir, record_filename)
+    def query(self, limit=None, offset=0, **filters):
+        """
+        Returns matching records, newest first.
+        """
+        where, params = self._where(**filters)
+        sql = f"SELECT record FROM records{where} ORDER BY timestamp_start DESC, id DESC LIMIT ? OFFSET ?"
+        rows = self._conn.execute(sql, params + [-1 if limit is None else limit, offset])
+        return [json.loads(row[0]) for row in rows]
+
+    def compact(self, keep_days=None, max_records=None):
+        """
+        Deletes records older than `keep_days` and beyond the newest `max_records`,
+        then reclaims the freed space. Returns the number of deleted records.
+        """
+        deleted = 0
+        with self._conn:
+            if keep_days is not None:
+                cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+                deleted += self._conn.execute("DELETE FROM records WHERE timestamp_start < ?", (cutoff,)).rowcount
+            if max_records is not None:
+                deleted += self._conn.execute(
+                    "DELETE FROM records WHERE id NOT IN "
+                    "(SELECT id FROM records ORDER BY timestamp_start DESC, id DESC LIMIT ?)",
+                    (max_records,),
+                ).rowcount
+        self._conn.execute("VACUUM")
+        return deleted
+
+    def import_legacy_records(self, memory_dir, remove_files=False):
+        """
+        Imports the per-file orchestration_record_*.json records from older versions.
+        Files already imported are skipped, so the import can safely be re-run.
+        """
+        imported = 0
+        for filename in sorted(os.listdir(memory_dir)):
+            if not (filename.startswith("orchestration_record_") and filename.endswith(".json")):
+                continue
+            filepath = os.path.join(memory_dir, filename)
             try:
-                with open(record_filepath, "w") as f:
-                    json.dump(orchestration_record, f, indent=4)
-                logger.info(f"Orchestration record saved to: {record_filepath}")
+                with open(filepath, 'r') as f:
+                    record = json.load(f)
+            except json.JSONDecodeError as e:
+                logger.error(f"Error decoding JSON from history file {filename}: {e}")
+                continue
             except IOError as e:
-                logger.error(f"Error saving orchestration record to {record_filepath}: {e}")
-
-            logger.info(f"Orchestration complete for task: '{args.task}'")
-            logger.info(f"Check the generated project at: {full_project_path}")
-
-        except Exception as e:
-            logger.critical(f"An unhandled critical error occurred during orchestration: {e}", exc_info=True)
-            # Attempt to save a minimal record of the critical failure
-            if 'orchestration_record' in locals():
-                orchestration_record["status"] = "critical_failure"
-                orchestration_record["timestamp_end"] = datetime.now().isoformat()
-                orchestration_record["error_details"] = str(e)
-                record_filename = f"orchestration_record_critical_failure_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
-                record_filepath = os.path.join(memory_dir, record_filename)
-                try:
-                    with open(record_filepath, "w") as f:
-                        json.dump(orchestration_record, f, indent=4)
-                    logger.info(f"Critical failure record saved to: {record_filepath}")
-                except IOError as save_e:
-                    logger.error(f"Failed to save critical failure record: {save_e}")
-            else:
-                logger.error("Could not save orchestration record for critical failure as record object was not initialized.")
+                logger.error(f"Error reading history file {filename}: {e}")
+                continue
+            if self.add(record, source=filename) is not None:
+                imported += 1
+            if remove_files:
+                os.remove(filepath)
+        return imported
 
-def display_history(memory_dir):
+def save_orchestration_record(memory_dir, record):
+    """
+    Appends an orchestration record to the history store.
+    """
+    try:
+        store = HistoryStore(memory_dir)
+        try:
+            record_id = store.add(record)
+        finally:
+            store.close()
+        logger.info(f"Orchestration record {record_id} saved to: {store.db_path}")
+        return record_id
+    except sqlite3.Error as e:
+        logger.error(f"Error saving orchestration record to {memory_dir}: {e}")
+        return None
+
+def display_history(memory_dir, status=None, agent=None, project_type=None, since=None, until=None, limit=20, offset=0):
     logger.info(f"Displaying orchestration history from: {memory_dir}")
-    records = []
+    filters = {"status": status, "agent": agent, "project_type": project_type, "since": since, "until": until}
     try:
-        for filename in os.listdir(memory_dir):
-            if filename.startswith("orchestration_record_") and filename.endswith(".json"):
-                filepath = os.path.join(memory_dir, filename)
-                try:
-                    with open(filepath, 'r') as f:
-                        record = json.load(f)
-                        records.append(record)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON from history file {filename}: {e}")
-                except IOError as e:
-                    logger.error(f"Error reading history file {filename}: {e}")
-    except OSError as e:
-        logger.error(f"Error accessing memory directory {memory_dir}: {e}")
+        store = HistoryStore(memory_dir)
+        try:
+            total = store.count(**filters)
+            records = store.query(limit=limit, offset=offset, **filters)
+        finally:
+            store.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading history store in {memory_dir}: {e}")
         logger.info(f"No orchestration history found.")
         return
 
     if not records:
         logger.info(f"No orchestration history found.")
+        if total == 0 and not any(filters.values()) and any(
+                name.startswith("orchestration_record_") for name in os.listdir(memory_dir)):
+            logger.info("Legacy orchestration_record_*.json files found. Run 'history-import' to index them.")
         return
 
-    # Sort records by timestamp (newest first)
-    records.sort(key=lambda x: x.get("timestamp_start", ""), reverse=True)
-
-    for i, record in enumerate(records):
-        logger.info(f"\n--- Orchestration Record {i+1} ---")
-        logger.info(f"  Task: {record.get("task", "N/A")}")
-        logger.info(f"  Project Type: {record.get("project_type", "N/A")}")
-        logger.info(f"  Project Path: {record.get("project_path", "N/A")}")
-        logger.info(f"  Status: {record.get("status", "N/A").upper()}")
-        logger.info(f"  Start Time: {record.get("timestamp_start", "N/A")}")
-        logger.info(f"  End Time: {record.get("timestamp_end", "N/A")}")
-        logger.info(f"  Agents Requested: {", ".join(record.get("agents_requested", []))}")
+    logger.info(f"Showing records {offset + 1}-{offset + len(records)} of {total}")
+    for i, record in enumerate(records, start=offset + 1):
+        logger.info(f"\n--- Orchestration Record {i} ---")
+        logger.info(f"  Task: {record.get('task', 'N/A')}")
+        logger.info(f"  Project Type: {record.get('project_type', 'N/A')}")
+        logger.info(f"  Project Path: {record.get('project_path', 'N/A')}")
+        logger.info(f"  Status: {record.get('status', 'N/A').upper()}")
+        logger.info(f"  Start Time: {record.get('timestamp_start', 'N/A')}")
+        logger.info(f"  End Time: {record.get('timestamp_end', 'N/A')}")
+        logger.info(f"  Agents Requested: {', '.join(record.get('agents_requested', []))}")
         agent_results = record.get("agent_results", {})
         if agent_results:
             logger.info("  Agent Results:")
-            for agent, res in agent_results.items():
-                status = res.get("status", "N/A")
+            for agent_name, res in agent_results.items():
+                agent_status = res.get("status", "N/A")
                 details = res.get("details", "")
-                logger.info(f"    - {agent}: {status.upper()} {f"({details})" if details else ""}")
+                logger.info(f"    - {agent_name}: {agent_status.upper()} {f'({details})' if details else ''}")
+
+def _percentile(sorted_values, fraction):
+    # Linear interpolation between the closest ranks
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def _summarize(samples):
+    summary = {}
+    for metric, values in samples.items():
+        values.sort()
+        summary[metric] = {
+            "count": len(values),
+            "sum": sum(values),
+            **{f"p{int(q * 100)}": _percentile(values, q) for q in STATS_QUANTILES},
+        }
+    return summary
+
+def _record_duration(record):
+    if "duration_seconds" in record:
+        return record["duration_seconds"]
+    try: # Records written before durations were stored
+        return (datetime.fromisoformat(record["timestamp_end"]) - datetime.fromisoformat(record["timestamp_start"])).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def compute_stats(records):
+    """
+    Computes percentiles of the per-agent metrics (STATS_AGENT_METRICS) and of the
+    per-orchestration timings, grouped by agent and by project type.
+    """
+    agent_samples = collections.defaultdict(lambda: collections.defaultdict(list))
+    project_samples = collections.defaultdict(lambda: collections.defaultdict(list))
+    for record in records:
+        for agent, result in record.get("agent_results", {}).items():
+            for metric in STATS_AGENT_METRICS:
+                if isinstance(result.get(metric), (int, float)):
+                    agent_samples[agent][metric].append(result[metric])
+        samples = project_samples[record.get("project_type", "unknown")]
+        duration = _record_duration(record)
+        if duration is not None:
+            samples["duration_seconds"].append(duration)
+        if "scaffold_seconds" in record:
+            samples["scaffold_seconds"].append(record["scaffold_seconds"])
+        if record.get("critical_path"):
+            samples["critical_path_seconds"].append(record["critical_path"]["seconds"])
+    return {
+        "agents": {agent: _summarize(samples) for agent, samples in agent_samples.items()},
+        "project_types": {project_type: _summarize(samples) for project_type, samples in project_samples.items()},
+    }
+
+def _prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_prometheus_textfile(path, stats):
+    """
+    Writes the stats as Prometheus summaries, atomically (for the node_exporter textfile collector).
+    """
+    lines = []
+    for group, label, prefix in (("agents", "agent", "orchestrator_agent"),
+                                 ("project_types", "project_type", "orchestrator_project")):
+        metrics = sorted({metric for summary in stats[group].values() for metric in summary})
+        for metric in metrics:
+            name = f"{prefix}_{metric}"
+            lines.append(f"# TYPE {name} summary")
+            for key, summary in sorted(stats[group].items()):
+                if metric not in summary:
+                    continue
+                values = summary[metric]
+                labels = f'{label}="{_prometheus_label(key)}"'
+                for q in STATS_QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {values[f"p{int(q * 100)}"]}')
+                lines.append(f"{name}_sum{{{labels}}} {values['sum']}")
+                lines.append(f"{name}_count{{{labels}}} {values['count']}")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, path)
+
+def export_metrics_textfile(memory_dir, path):
+    """
+    Refreshes the Prometheus text file from the most recent orchestration records.
+    """
+    try:
+        store = HistoryStore(memory_dir)
+        try:
+            records = store.query(limit=CONFIG.get("metrics_window_records", 1000))
+        finally:
+            store.close()
+        write_prometheus_textfile(path, compute_stats(records))
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Error exporting metrics to {path}: {e}")
+
+def display_stats(memory_dir, agent=None, project_type=None, since=None, until=None, limit=None, prometheus_file=None):
+    filters = {"agent": agent, "project_type": project_type, "since": since, "until": until}
+    try:
+        store = HistoryStore(memory_dir)
+        try:
+            records = store.query(limit=limit, **filters)
+        finally:
+            store.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading history store in {memory_dir}: {e}")
+        return
+    if not records:
+        logger.info("No orchestration history found.")
+        return
+
+    stats = compute_stats(records)
+    logger.info(f"Statistics over {len(records)} orchestration records")
+    for title, group in (("Agent", "agents"), ("Project Type", "project_types")):
+        for key, summary in sorted(stats[group].items()):
+            if agent and group == "agents" and key != agent:
+                continue
+            logger.info(f"\n--- {title}: {key} ---")
+            for metric, values in summary.items():
+                logger.info(f"  {metric:<22} n={values['count']:<6} p50={values['p50']:<12.4g} "
+                            f"p95={values['p95']:<12.4g} p99={values['p99']:.4g}")
+    if prometheus_file:
+        write_prometheus_textfile(prometheus_file, stats)
+        logger.info(f"Prometheus metrics written to {prometheus_file}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.warning("Orchestrator interrupted. Running agents were stopped.")
+        sys.exit(130)
\ No newline at end of file